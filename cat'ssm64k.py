@@ -1,9 +1,11 @@
+import time
+STARTUP_T0 = time.perf_counter()  # Start of the startup report (import -> first presented frame)
+import os
+import json
 import pygame
 import math
 import random
-
-# Initialize Pygame
-pygame.init()
+from collections import OrderedDict
 
 # ---------------- CONFIG ----------------
 WIDTH, HEIGHT = 800, 600
@@ -13,12 +15,14 @@ BG = (0, 0, 40)
 FG = (220, 220, 255)
 HL = (255, 255, 0)
 
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("SUPER MARIO 64 - DEBUG COURSE SELECT")
-clock = pygame.time.Clock()
+FONT_INDEX_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                               "pysm64", "fonts.json")
 
-font = pygame.font.SysFont("Courier New", 18, bold=True)
-title_font = pygame.font.SysFont("Courier New", 32, bold=True)
+# Created by init_display() when main() starts, not at import
+screen = None
+clock = None
+font = None
+title_font = None
 
 # ---------------- COURSE DATA ----------------
 # (Name, Background Color, Icon Color, Theme Color)
@@ -52,16 +56,112 @@ current_course = 0
 level_time_ms = 0
 particles = []
 
+# ---------------- DIRTY RECTS ----------------
+ANIMATED_ICONS = (13, 14)  # Tiny-Huge swap and Tick Tock Clock hand redraw every frame
+menu_bg = None             # Debug menu without particles/animated icons; dirty rects are restored from it
+menu_bg_cursor = None      # Cursor menu_bg was drawn for
+menu_dirty = []            # Rects drawn over menu_bg last frame
+
 # ---------------- HELPERS ----------------
+_font_index = None
+
+def cached_sysfont(name, size, bold=False):
+    """pygame.font.SysFont without the system font scan (resolved file cached in FONT_INDEX_PATH)."""
+    global _font_index
+    if _font_index is None:
+        try:
+            with open(FONT_INDEX_PATH) as f:
+                _font_index = json.load(f)
+        except (OSError, ValueError):
+            _font_index = {}
+    key = f"{name}|{int(bold)}"
+    entry = _font_index.get(key)
+    if entry is None or (entry[0] is not None and not os.path.exists(entry[0])):
+        found = []
+        pygame.font.SysFont(name, size, bold, constructor=lambda path, size, b, i: found.append([path, b]))
+        entry = _font_index[key] = found[0]
+        try:
+            os.makedirs(os.path.dirname(FONT_INDEX_PATH), exist_ok=True)
+            with open(FONT_INDEX_PATH, "w") as f:
+                json.dump(_font_index, f)
+        except OSError:
+            pass
+    path, emulate_bold = entry
+    f = pygame.font.Font(path, size)
+    if emulate_bold:
+        f.set_bold(True)
+    return f
+
+def init_display():
+    global screen, clock, font, title_font
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("SUPER MARIO 64 - DEBUG COURSE SELECT")
+    clock = pygame.time.Clock()
+    font = cached_sysfont("Courier New", 18, bold=True)
+    title_font = cached_sysfont("Courier New", 32, bold=True)
+
 def iround(x: float) -> int:
     return int(round(x))
 
+ALPHA_POOL_SIZE = 32  # Distinct (size, color) overlays kept for alpha_rect
+_alpha_pool = OrderedDict()
+alpha_pool_stats = {"hits": 0, "misses": 0}
+
 def alpha_rect(surface: pygame.Surface, rect: pygame.Rect, rgb=(0, 0, 0), alpha=128):
-    """Draw a semi-transparent rectangle (pygame.draw ignores alpha on the main display)."""
-    s = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
-    s.fill((rgb[0], rgb[1], rgb[2], alpha))
+    """Draw a semi-transparent rectangle (pygame.draw ignores alpha on the main display).
+    The filled overlay is pooled per (size, color), so repeated calls don't allocate."""
+    key = (rect.width, rect.height, rgb[0], rgb[1], rgb[2], alpha)
+    s = _alpha_pool.get(key)
+    if s is not None:
+        alpha_pool_stats["hits"] += 1
+        _alpha_pool.move_to_end(key)
+    else:
+        alpha_pool_stats["misses"] += 1
+        s = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
+        s.fill((rgb[0], rgb[1], rgb[2], alpha))
+        _alpha_pool[key] = s
+        if len(_alpha_pool) > ALPHA_POOL_SIZE:
+            _alpha_pool.popitem(last=False)
     surface.blit(s, rect.topleft)
 
+_gradient_cache = {}  # (size, top, bottom) -> Surface
+
+def gradient_surface(size, top, bottom):
+    """Vertical top->bottom gradient, built once per (size, colors) and reused every frame.
+    Entries for other sizes are dropped when the resolution changes."""
+    key = (tuple(size), tuple(top), tuple(bottom))
+    surf = _gradient_cache.get(key)
+    if surf is not None:
+        return surf
+    if any(k[0] != key[0] for k in _gradient_cache):
+        _gradient_cache.clear()
+    w, h = key[0]
+    # Build one 1px-wide column, then stretch it (nearest-neighbour keeps rows exact)
+    strip = pygame.Surface((1, h))
+    for y in range(h):
+        t = y / h
+        strip.set_at((0, y), tuple(int(top[i] * (1 - t) + bottom[i] * t) for i in range(3)))
+    surf = pygame.transform.scale(strip, (w, h)).convert()
+    _gradient_cache[key] = surf
+    return surf
+
+TEXT_CACHE_SIZE = 128  # Rendered strings kept before least-recently-used eviction
+_text_cache = OrderedDict()
+
+def render_text(font, text, color, antialias=True):
+    """font.render() through a bounded LRU keyed by (font, text, color, antialias)."""
+    key = (font, text, tuple(color), antialias)
+    surf = _text_cache.get(key)
+    if surf is not None:
+        _text_cache.move_to_end(key)
+        return surf
+    surf = font.render(text, antialias, color)
+    _text_cache[key] = surf
+    if len(_text_cache) > TEXT_CACHE_SIZE:
+        _text_cache.popitem(last=False)
+    return surf
+
 # ---------------- PARTICLE SYSTEM ----------------
 class Particle:
     def __init__(self, x, y, color):
@@ -81,7 +181,7 @@ class Particle:
         return self.life > 0 and self.size > 0.5
 
     def draw(self, surface):
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), max(1, int(self.size)))
+        return pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), max(1, int(self.size)))
 
 # ---------------- DRAWING FUNCTIONS ----------------
 def draw_castle(surface, x, y, scale=1.0):
@@ -225,57 +325,82 @@ def draw_star(surface, x, y, size, color):
     pts = [(int(px), int(py)) for (px, py) in pts]
     pygame.draw.polygon(surface, color, pts)
 
-def draw_debug_menu():
-    screen.fill(BG)
+def icon_pos(i):
+    """Center of course i's tile in the 4x4 grid."""
+    return 100 + (i % 4) * 200, 100 + (i // 4) * 120
 
-    title = title_font.render("SUPER MARIO 64 - DEBUG COURSE SELECT", True, HL)
-    screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 20))
+def draw_debug_menu(full=True):
+    """Draw the course select grid.
 
-    # Course grid (4x4)
-    for i, (name, *_colors) in enumerate(COURSES):
-        row = i // 4
-        col = i % 4
-        x = 100 + col * 200
-        y = 100 + row * 120
+    With full=False only what changed since the last call is repainted (particles,
+    animated icons); returns the rects to push, or None after a full repaint.
+    """
+    global menu_bg, menu_bg_cursor
 
-        draw_level_icon(screen, x, y, i, i == cursor)
+    if full or menu_bg is None or menu_bg_cursor != cursor:
+        menu_bg = pygame.Surface(screen.get_size())
+        menu_bg_cursor = cursor
+        menu_bg.fill(BG)
+
+        title = render_text(title_font, "SUPER MARIO 64 - DEBUG COURSE SELECT", HL)
+        menu_bg.blit(title, (WIDTH // 2 - title.get_width() // 2, 20))
+
+        # Course grid (4x4)
+        for i, (name, *_colors) in enumerate(COURSES):
+            x, y = icon_pos(i)
 
-        num_text = font.render(f"{i:02d}", True, FG if i != cursor else HL)
-        name_text = font.render(name, True, FG if i != cursor else HL)
+            draw_level_icon(menu_bg, x, y, i, i == cursor)
 
-        screen.blit(num_text, (x - num_text.get_width() // 2, y + 50))
-        screen.blit(name_text, (x - name_text.get_width() // 2, y + 70))
+            num_text = render_text(font, f"{i:02d}", FG if i != cursor else HL)
+            name_text = render_text(font, name, FG if i != cursor else HL)
 
-        if i == cursor:
-            for _ in range(2):
-                particles.append(Particle(
-                    x + random.randint(-30, 30),
-                    y + random.randint(-30, 30),
-                    HL
-                ))
+            menu_bg.blit(num_text, (x - num_text.get_width() // 2, y + 50))
+            menu_bg.blit(name_text, (x - name_text.get_width() // 2, y + 70))
+
+        hint1 = render_text(font, "UP/DOWN/LEFT/RIGHT: SELECT    ENTER: LOAD COURSE", FG)
+        hint2 = render_text(font, "ESC: RETURN TO CASTLE    F1: RELOAD TEXTURES", FG)
+        menu_bg.blit(hint1, (WIDTH // 2 - hint1.get_width() // 2, HEIGHT - 60))
+        menu_bg.blit(hint2, (WIDTH // 2 - hint2.get_width() // 2, HEIGHT - 35))
+
+        screen.blit(menu_bg, (0, 0))
+        dirty = None
+    else:
+        # Restore everything drawn over the static menu last frame
+        for r in menu_dirty:
+            screen.blit(menu_bg, r, r)
+        dirty = list(menu_dirty)
+    menu_dirty.clear()
+
+    # Animated icons
+    for i in ANIMATED_ICONS:
+        x, y = icon_pos(i)
+        draw_level_icon(screen, x, y, i, i == cursor)
+        menu_dirty.append(pygame.Rect(x - 60, y - 40, 120, 80))
+
+    x, y = icon_pos(cursor)
+    for _ in range(2):
+        particles.append(Particle(
+            x + random.randint(-30, 30),
+            y + random.randint(-30, 30),
+            HL
+        ))
 
     # Particles
     for p in particles[:]:
         if p.update():
-            p.draw(screen)
+            menu_dirty.append(p.draw(screen))
         else:
             particles.remove(p)
 
-    hint1 = font.render("UP/DOWN/LEFT/RIGHT: SELECT    ENTER: LOAD COURSE", True, FG)
-    hint2 = font.render("ESC: RETURN TO CASTLE    F1: RELOAD TEXTURES", True, FG)
-    screen.blit(hint1, (WIDTH // 2 - hint1.get_width() // 2, HEIGHT - 60))
-    screen.blit(hint2, (WIDTH // 2 - hint2.get_width() // 2, HEIGHT - 35))
+    if dirty is None:
+        return None
+    return dirty + menu_dirty
 
 def draw_level_view():
     bg_color, icon_color, theme_color = COURSES[current_course][1:]
 
-    # Animated background gradient
-    for y in range(0, HEIGHT, 2):
-        progress = y / HEIGHT
-        r = int(bg_color[0] * (1 - progress) + 0 * progress)
-        g = int(bg_color[1] * (1 - progress) + 0 * progress)
-        b = int(bg_color[2] * (1 - progress) + 20 * progress)
-        pygame.draw.line(screen, (r, g, b), (0, y), (WIDTH, y))
+    # Background gradient (cached per course color)
+    screen.blit(gradient_surface(screen.get_size(), bg_color, (0, 0, 20)), (0, 0))
 
     # Floating stars
     t = pygame.time.get_ticks()
@@ -290,35 +415,30 @@ def draw_level_view():
     alpha_rect(screen, panel_rect, (0, 0, 0), alpha=140)
     pygame.draw.rect(screen, theme_color, panel_rect, 3)
 
-    course_num = font.render(f"COURSE {current_course:02d}", True, HL)
-    course_name = font.render(COURSES[current_course][0], True, FG)
+    course_num = render_text(font, f"COURSE {current_course:02d}", HL)
+    course_name = render_text(font, COURSES[current_course][0], FG)
     screen.blit(course_num, (70, 70))
     screen.blit(course_name, (70, 100))
 
     total_seconds = level_time_ms // 1000
     minutes = total_seconds // 60
     seconds = total_seconds % 60
-    timer_text = font.render(f"TIME: {minutes:02d}:{seconds:02d}", True, FG)
+    timer_text = render_text(font, f"TIME: {minutes:02d}:{seconds:02d}", FG)
     screen.blit(timer_text, (70, 140))
 
-    stars = font.render("STARS: 0/7", True, FG)
+    stars = render_text(font, "STARS: 0/7", FG)
     screen.blit(stars, (70, 170))
 
     draw_level_icon(screen, 520, 210, current_course, True)
 
-    hint1 = font.render("ARROWS: MOVE    SPACE: JUMP    Z: ACTION", True, FG)
-    hint2 = font.render("ESC: RETURN TO DEBUG MENU", True, FG)
+    hint1 = render_text(font, "ARROWS: MOVE    SPACE: JUMP    Z: ACTION", FG)
+    hint2 = render_text(font, "ESC: RETURN TO DEBUG MENU", FG)
     screen.blit(hint1, (WIDTH // 2 - hint1.get_width() // 2, HEIGHT - 80))
     screen.blit(hint2, (WIDTH // 2 - hint2.get_width() // 2, HEIGHT - 40))
 
 def draw_castle_view():
-    # Sky gradient
-    for y in range(HEIGHT):
-        progress = y / HEIGHT
-        r = int(100 * (1 - progress) + 0 * progress)
-        g = int(150 * (1 - progress) + 50 * progress)
-        b = int(255 * (1 - progress) + 100 * progress)
-        pygame.draw.line(screen, (r, g, b), (0, y), (WIDTH, y))
+    # Sky gradient (cached)
+    screen.blit(gradient_surface(screen.get_size(), (100, 150, 255), (0, 50, 100)), (0, 0))
 
     pygame.draw.rect(screen, (100, 80, 60), (0, HEIGHT - 100, WIDTH, 100))
 
@@ -349,16 +469,19 @@ def draw_castle_view():
         my = cy - 100 + 50 * math.sin(angle)
         pygame.draw.circle(screen, (255, 255, 200), (int(mx), int(my)), 15)
 
-    title = title_font.render("PEACH'S CASTLE", True, (255, 220, 180))
+    title = render_text(title_font, "PEACH'S CASTLE", (255, 220, 180))
     screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
 
-    hint = font.render("PRESS ENTER FOR DEBUG MENU", True, FG)
+    hint = render_text(font, "PRESS ENTER FOR DEBUG MENU", FG)
     screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, HEIGHT - 50))
 
 # ---------------- MAIN LOOP ----------------
-def main():
+def main(dirty_rects=True):
     global cursor, state, current_course, level_time_ms
 
+    init_display()
+    startup_reported = False
+    drawn_state = None  # State on screen last frame; the debug menu repaints fully when it changes
     running = True
     while running:
         dt = clock.tick(FPS)
@@ -366,6 +489,8 @@ def main():
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                drawn_state = None
 
             if event.type == pygame.KEYDOWN:
                 if state == STATE_CASTLE:
@@ -411,17 +536,27 @@ def main():
             level_time_ms += dt
 
         # ---------------- DRAW ----------------
+        dirty = None
         if state == STATE_DEBUG:
-            draw_debug_menu()
+            dirty = draw_debug_menu(full=not dirty_rects or drawn_state != STATE_DEBUG)
         elif state == STATE_LEVEL:
             draw_level_view()
         elif state == STATE_CASTLE:
             draw_castle_view()
+        drawn_state = state
 
-        fps_text = font.render(f"FPS: {int(clock.get_fps())}", True, FG)
-        screen.blit(fps_text, (10, HEIGHT - 30))
+        fps_text = render_text(font, f"FPS: {int(clock.get_fps())}", FG)
+        fps_rect = screen.blit(fps_text, (10, HEIGHT - 30))
+        if state == STATE_DEBUG:
+            menu_dirty.append(fps_rect) # Restored from menu_bg next frame, full repaint or not
 
-        pygame.display.flip()
+        if dirty is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty + [fps_rect])
+        if not startup_reported:
+            print(f"startup: {(time.perf_counter() - STARTUP_T0) * 1000:.0f} ms from import to first frame")
+            startup_reported = True
 
     pygame.quit()
 
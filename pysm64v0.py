@@ -9,6 +9,10 @@ try:
     import pygame_ce as pygame
 except ImportError:
     import pygame
+try:
+    import numpy as np
+except ImportError:
+    np = None # No Mode 7 floor: the grass quad is drawn as a polygon instead
 
 # ============================================================
 # pysm64 - Custom Super Mario 64 Pseudo-3D Engine
@@ -47,6 +51,11 @@ TITLE_GOLD    = (255, 220, 0)
 TITLE_RED     = (200, 0, 0)
 TITLE_OUTLINE = (80, 0, 0)
 
+# MODE 7 FLOOR
+MODE7_TEXEL = 25         # World units per ground texel
+MODE7_TEXTURE_SIZE = 64  # Texels per side; power of two so it tiles with a mask
+MODE7_PIXEL = 2          # Screen pixels per floor sample side (scaled up in one blit)
+
 # ---------------- INIT ----------------
 pygame.init()
 screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED | pygame.RESIZABLE)
@@ -244,6 +253,53 @@ def build_castle_grounds():
 
     return polys
 
+# ---------------- MODE 7 FLOOR ----------------
+def make_ground_texture(color, size=MODE7_TEXTURE_SIZE, seed=64):
+    """Procedural tiling ground texture: checkered base color with speckle noise."""
+    rng = np.random.default_rng(seed)
+    u, v = np.meshgrid(np.arange(size), np.arange(size), indexing="ij")
+    shade = 1 + ((u // 8 + v // 8) % 2) * 0.12 - 0.06 + rng.uniform(-0.08, 0.08, (size, size))
+    return np.clip(np.array(color[:3], dtype=np.float64) * shade[..., None], 0, 255).astype(np.uint8)
+
+class Mode7Floor:
+    """Infinite textured ground plane at height y, sampled per scanline with NumPy.
+    Costs one reduced-resolution pass over the screen however large the course is."""
+    def __init__(self, y, color):
+        self.y = y
+        self.texture = make_ground_texture(color).reshape(-1, 3)
+        self.color = np.zeros((WIDTH // MODE7_PIXEL, HEIGHT // MODE7_PIXEL, 3), dtype=np.uint8) # surfarray layout
+        self.surface = pygame.Surface(self.color.shape[:2])
+        # Camera-space ray through each sample center is (col, row, 1)
+        self.cols = ((np.arange(self.color.shape[0]) + 0.5) * MODE7_PIXEL - WIDTH // 2) / FOV
+        self.rows = ((np.arange(self.color.shape[1]) + 0.5) * MODE7_PIXEL - HEIGHT // 2) / FOV
+        self.rows_key = None # Camera height the cached scanline terms are for
+
+    def _scanlines(self, cam):
+        """Rows that hit the plane in front of the camera and their hit distances (depend on camera height only)."""
+        if cam.y != self.rows_key:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = (self.y - cam.y) / self.rows
+            hit = np.flatnonzero(np.isfinite(t) & (t > 1))
+            r0, r1 = (hit[0], hit[-1] + 1) if len(hit) else (0, 0) # One contiguous band
+            self.rows_key, self.band = cam.y, (r0, r1, t[r0:r1] / MODE7_TEXEL)
+        return self.band
+
+    def draw(self, screen, cam, background=SKY_BLUE):
+        """Sky + floor over the whole screen (replaces the sky fill)."""
+        r0, r1, t = self._scanlines(cam)
+        self.color[:] = background[:3]
+        if r0 < r1:
+            # Undo yaw (inverse of Camera.project): world x/z are affine in the column along each row
+            s, c = math.sin(-cam.yaw), math.cos(-cam.yaw)
+            cols = self.cols[:, None]
+            u = cam.x / MODE7_TEXEL + t * (cols * c + s)
+            v = cam.z / MODE7_TEXEL + t * (c - cols * s)
+            size = MODE7_TEXTURE_SIZE
+            texel = (np.floor(u).astype(np.int32) & (size - 1)) * size + (np.floor(v).astype(np.int32) & (size - 1))
+            self.color[:, r0:r1] = self.texture[texel]
+        pygame.surfarray.blit_array(self.surface, self.color)
+        pygame.transform.scale(self.surface, screen.get_size(), screen)
+
 # ---------------- SM64-STYLE MAIN MENU ----------------
 def draw_main_menu():
     """SM64-style main menu: blue sky gradient, title, star, press start, copyright."""
@@ -296,6 +352,10 @@ def draw_main_menu():
 mario = Mario()
 cam = Camera()
 world_polys = build_castle_grounds()
+# The grass base quad becomes an infinite Mode 7 floor when NumPy is available
+world_floor = Mode7Floor(0, GRASS_GREEN) if np is not None else None
+if world_floor is not None:
+    world_polys = world_polys[1:]
 
 running = True
 while running:
@@ -328,7 +388,10 @@ while running:
     cam.update(mario.x, mario.z)
 
     # 3. Render
-    screen.fill(SKY_BLUE)
+    if world_floor is not None:
+        world_floor.draw(screen, cam)
+    else:
+        screen.fill(SKY_BLUE)
     
     # Sort polygons by depth (Painter's Algorithm)
     def get_poly_dist(poly):
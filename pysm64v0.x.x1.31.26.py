@@ -3,12 +3,24 @@
     Port to pygame-ce: use pygame_ce if available, else pygame.
     Import and run:  import pysm64; pysm64.run()
     """
+    import time
+    STARTUP_T0 = time.perf_counter() # Start of the startup report (import -> first presented frame)
+    import os
     import sys
+    import json
     import math
+    import mmap
+    import struct
+    import threading
+    from collections import OrderedDict
     try:
         import pygame_ce as pygame
     except ImportError:
         import pygame
+    try:
+        import numpy as np
+    except ImportError:
+        np = None  # batched paths fall back to plain Python
 
     # ============================================================
     # pysm64 - Custom Super Mario 64 Pseudo-3D Engine
@@ -26,6 +38,11 @@
     PITCH_MAX = math.radians(62)
     CAM_LAG = 0.08
     FOV = WIDTH / (2 * math.tan(FOV_RAD / 2))  # horizontal FOV scale
+    NEAR = 1  # project() rejects rz <= NEAR
+    GUARD_BAND = 2 * WIDTH  # Screen-space clip distance from the center for filled polygons
+    # Frustum half-angles (horizontal from FOV_RAD, vertical from the aspect ratio)
+    HALF_FOV_H = FOV_RAD / 2
+    HALF_FOV_V = math.atan((HEIGHT / 2) / FOV)
 
     # PHYSICS CONSTANTS (Tuned for SM64 feel)
     MAX_SPEED = 12
@@ -35,9 +52,15 @@
     GRAVITY = 0.8
     JUMP_FORCE = 16
     TRIPLE_JUMP_MULTIPLIER = 1.2
+    # The constants above are per step; physics always steps at SIM_HZ whatever the frame rate
+    SIM_HZ = 60
+    SIM_DT = 1000 / SIM_HZ  # ms per physics step
+    MAX_SIM_STEPS = 5       # Steps per rendered frame before the game slows down instead of spiralling
 
     # COLORS
     SKY_BLUE      = (100, 150, 255)
+    BLACK         = (0, 0, 0)
+    WHITE         = (255, 255, 255)
     SKY_TOP       = (135, 195, 255)   # SM64 menu gradient top
     SKY_BOTTOM    = (50, 100, 200)   # SM64 menu gradient bottom
     GRASS_GREEN   = (50, 160, 50)
@@ -81,12 +104,16 @@
 
     class Camera:
         """SM64 1:1 Lakitu camera: spherical orbit, 52° FOV, pitch limits."""
+        INTERP_ATTRS = ("x", "y", "z", "yaw", "pitch") # Blended between physics steps for drawing
+
         def __init__(self):
             self.x, self.y, self.z = 0, 200, 0
             self.yaw = 0
             self.pitch = math.radians(15)
             self.target_yaw = 0
             self.target_pitch = math.radians(15)
+            self.visible_count = 0 # Last cull_spheres() result, for verifying culling
+            self.culled_count = 0
 
         def update(self, target_x, target_y, target_z):
             # Lakitu: camera orbits target at CAM_DIST, smooth lag
@@ -106,6 +133,13 @@
 
         def project(self, x, y, z):
             """Project 3D to 2D with SM64 FOV; camera space uses yaw+pitch."""
+            rx, ry, rz = self.to_view(x, y, z)
+            if rz <= NEAR:
+                return None
+            return self.project_view(rx, ry, rz)
+
+        def to_view(self, x, y, z):
+            """World space -> camera space (rz is depth along the view direction)."""
             rx, ry, rz = x - self.x, y - self.y, z - self.z
             # Rotate by -yaw (Y axis)
             sy, cy = math.sin(-self.yaw), math.cos(-self.yaw)
@@ -113,15 +147,218 @@
             # Rotate by -pitch (X axis, so look up/down)
             sp, cp = math.sin(-self.pitch), math.cos(-self.pitch)
             ry, rz = ry * cp - rz * sp, ry * sp + rz * cp
-            if rz <= 1:
-                return None
+            return rx, ry, rz
+
+        def project_view(self, rx, ry, rz):
+            """Perspective divide for a camera-space point in front of the near plane."""
             scale = FOV / rz
             sx = WIDTH // 2 + rx * scale
             sy = HEIGHT // 2 + ry * scale
             return (sx, sy, scale)
 
+        def project_many(self, points, keep=None):
+            """Project a whole vertex buffer at once (same math as project()).
+            Returns (sx, sy, scale, behind); behind[i] is True where project() would give None.
+            If keep is given, only those vertices are transformed; the rest report behind."""
+            if keep is not None:
+                if np is None:
+                    kept = [p for p, k in zip(points, keep) if k]
+                else:
+                    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+                    kept = points[keep]
+                kxs, kys, kscales, kbehind = self.project_many(kept)
+                if np is None:
+                    out = ([0.0] * len(points), [0.0] * len(points), [0.0] * len(points), [True] * len(points))
+                    j = 0
+                    for i, k in enumerate(keep):
+                        if k:
+                            out[0][i], out[1][i], out[2][i], out[3][i] = kxs[j], kys[j], kscales[j], kbehind[j]
+                            j += 1
+                    return out
+                xs, ys, scales = np.zeros(len(points)), np.zeros(len(points)), np.zeros(len(points))
+                behind = np.ones(len(points), dtype=bool)
+                xs[keep], ys[keep], scales[keep], behind[keep] = kxs, kys, kscales, kbehind
+                return xs, ys, scales, behind
+            sy_, cy = math.sin(-self.yaw), math.cos(-self.yaw)
+            sp, cp = math.sin(-self.pitch), math.cos(-self.pitch)
+            if np is None:
+                xs, ys, scales, behind = [], [], [], []
+                for x, y, z in points:
+                    rx, ry, rz = x - self.x, y - self.y, z - self.z
+                    rx, rz = rx * cy - rz * sy_, rx * sy_ + rz * cy
+                    ry, rz = ry * cp - rz * sp, ry * sp + rz * cp
+                    scale = FOV / rz if rz > NEAR else 0.0
+                    xs.append(WIDTH // 2 + rx * scale)
+                    ys.append(HEIGHT // 2 + ry * scale)
+                    scales.append(scale)
+                    behind.append(rz <= NEAR)
+                return xs, ys, scales, behind
+            rx, ry, rz = self.view_many(points)
+            behind = rz <= NEAR
+            scale = np.where(behind, 0.0, FOV / np.where(behind, 1.0, rz))
+            sx = WIDTH // 2 + rx * scale
+            sy = HEIGHT // 2 + ry * scale
+            return sx, sy, scale, behind
+
+        def view_many(self, points):
+            """Vectorized to_view() over an (N, 3) array (NumPy only); returns rx, ry, rz arrays."""
+            sy_, cy = math.sin(-self.yaw), math.cos(-self.yaw)
+            sp, cp = math.sin(-self.pitch), math.cos(-self.pitch)
+            pts = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+            rx = pts[:, 0] - self.x
+            ry = pts[:, 1] - self.y
+            rz = pts[:, 2] - self.z
+            rx, rz = rx * cy - rz * sy_, rx * sy_ + rz * cy
+            ry, rz = ry * cp - rz * sp, ry * sp + rz * cp
+            return rx, ry, rz
+
+        def cull_spheres(self, centers, radii):
+            """Frustum-test bounding spheres (FOV_RAD + current yaw/pitch).
+            Returns a visibility mask and records visible_count / culled_count."""
+            sy_, cy = math.sin(-self.yaw), math.cos(-self.yaw)
+            sp, cp = math.sin(-self.pitch), math.cos(-self.pitch)
+            sh, ch = math.sin(HALF_FOV_H), math.cos(HALF_FOV_H)
+            sv, cv = math.sin(HALF_FOV_V), math.cos(HALF_FOV_V)
+            if np is None:
+                mask = []
+                for (x, y, z), r in zip(centers, radii):
+                    rx, ry, rz = x - self.x, y - self.y, z - self.z
+                    rx, rz = rx * cy - rz * sy_, rx * sy_ + rz * cy
+                    ry, rz = ry * cp - rz * sp, ry * sp + rz * cp
+                    mask.append(rz + r > NEAR
+                                and abs(rx) * ch - rz * sh <= r
+                                and abs(ry) * cv - rz * sv <= r)
+                self.visible_count = sum(mask)
+                self.culled_count = len(mask) - self.visible_count
+                return mask
+            c = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+            r = np.asarray(radii, dtype=np.float64)
+            rx = c[:, 0] - self.x
+            ry = c[:, 1] - self.y
+            rz = c[:, 2] - self.z
+            rx, rz = rx * cy - rz * sy_, rx * sy_ + rz * cy
+            ry, rz = ry * cp - rz * sp, ry * sp + rz * cp
+            mask = ((rz + r > NEAR)
+                    & (np.abs(rx) * ch - rz * sh <= r)
+                    & (np.abs(ry) * cv - rz * sv <= r))
+            self.visible_count = int(mask.sum())
+            self.culled_count = len(mask) - self.visible_count
+            return mask
+
+    # ---------------- SURFACE POOL ----------------
+    class SpriteCache:
+        """Bounded LRU of pre-drawn surfaces (keyed by quantized size + color) with hit/miss counters."""
+        def __init__(self, capacity=64, max_bytes=None):
+            self.capacity = capacity
+            self.max_bytes = max_bytes
+            self.bytes = 0
+            self.items = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
+        def get(self, key, build):
+            """Cached surface for key, calling build() only on a miss."""
+            surf = self.items.get(key)
+            if surf is not None:
+                self.hits += 1
+                self.items.move_to_end(key)
+                return surf
+            self.misses += 1
+            surf = self.items[key] = build()
+            self.bytes += surf.get_bytesize() * surf.get_width() * surf.get_height()
+            while len(self.items) > 1 and (len(self.items) > self.capacity or
+                                           (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, old = self.items.popitem(last=False)
+                self.bytes -= old.get_bytesize() * old.get_width() * old.get_height()
+            return surf
+
+    SHADOW_SIZE_STEP = 2          # Shadow sprites are quantized to this many pixels
+    SHADOW_SPRITE_MAX_SIZE = 480  # Wider (camera right over it) shadows go through shadow_overlay instead
+    shadow_sprites = SpriteCache(capacity=64, max_bytes=4 * 1024 * 1024)
+    shadow_overlay = None         # Screen-sized alpha surface reused for oversized shadows
+
+    def shadow_sprite(w, h, color=SHADOW):
+        """Pooled alpha ellipse about w x h pixels (rounded to SHADOW_SIZE_STEP), or None when
+        wider than SHADOW_SPRITE_MAX_SIZE (draw_shadow_direct)."""
+        if w > SHADOW_SPRITE_MAX_SIZE: return None
+        w = max(SHADOW_SIZE_STEP, int(round(w / SHADOW_SIZE_STEP)) * SHADOW_SIZE_STEP)
+        h = max(SHADOW_SIZE_STEP, int(round(h / SHADOW_SIZE_STEP)) * SHADOW_SIZE_STEP)
+
+        def build():
+            surf = pygame.Surface((w, h), pygame.SRCALPHA)
+            pygame.draw.ellipse(surf, color, (0, 0, w, h))
+            return surf
+        return shadow_sprites.get((w, h, tuple(color)), build)
+
+    def draw_shadow_direct(screen, rect, color=SHADOW):
+        """Alpha ellipse of any size through one reused screen-sized surface; only its on-screen part is touched."""
+        global shadow_overlay
+        area = rect.clip(screen.get_rect())
+        if not area: return
+        if shadow_overlay is None or shadow_overlay.get_size() != screen.get_size():
+            shadow_overlay = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+        shadow_overlay.fill((0, 0, 0, 0), area)
+        pygame.draw.ellipse(shadow_overlay, color, rect)
+        screen.blit(shadow_overlay, area, area)
+
+    MARIO_SIZE_STEP = 1.06        # Atlas sizes are geometric buckets this far apart
+    MARIO_FACINGS = 16            # Relative facing angles are quantized to this many directions
+    MARIO_SPRITE_MAX_SIZE = 240   # Larger (very close) Marios are drawn directly instead of cached
+    mario_sprites = SpriteCache(capacity=256, max_bytes=16 * 1024 * 1024)
+
+    def draw_mario_shapes(surface, sx, sy, size, brim_off_x):
+        """Mario's primitives (cap, brim, body, buttons) anchored at the top of his body."""
+        # Cap
+        pygame.draw.circle(surface, MARIO_RED, (sx, sy - size*0.4), size/2)
+        # Brim
+        pygame.draw.circle(surface, MARIO_RED, (sx + brim_off_x, sy - size*0.3), size/2.5)
+        # Body
+        body_rect = pygame.Rect(sx - size/3, sy, size/1.5, size/1.5)
+        pygame.draw.rect(surface, MARIO_BLUE, body_rect, border_radius=4)
+        # Buttons
+        pygame.draw.circle(surface, (255,255,0), (sx - size/6, sy + size/4), size/10)
+        pygame.draw.circle(surface, (255,255,0), (sx + size/6, sy + size/4), size/10)
+
+    def mario_sprite(size, rel_angle):
+        """Atlas entry for Mario at a given size and facing relative to the camera.
+
+        Returns (surface, anchor_x, anchor_y), or None when size is past MARIO_SPRITE_MAX_SIZE.
+        """
+        if size <= 0 or size > MARIO_SPRITE_MAX_SIZE: return None
+        bucket = int(round(math.log(size) / math.log(MARIO_SIZE_STEP)))
+        facing = int(round(rel_angle / (2 * math.pi) * MARIO_FACINGS)) % MARIO_FACINGS
+        q_size = MARIO_SIZE_STEP ** bucket
+        # Brim swings up to size/3 past its size/2.5 radius; cap reaches 0.9 * size above the anchor
+        ax = int(math.ceil(q_size * (1/3 + 1/2.5))) + 1
+        ay = int(math.ceil(q_size * 0.9)) + 1
+
+        def build():
+            surf = pygame.Surface((2 * ax, ay + int(math.ceil(q_size / 1.5)) + 1), pygame.SRCALPHA)
+            brim_off_x = math.sin(facing * 2 * math.pi / MARIO_FACINGS) * (q_size/3)
+            draw_mario_shapes(surf, ax, ay, q_size, brim_off_x)
+            return surf
+        return mario_sprites.get((bucket, facing), build), ax, ay
+
     # ---------------- ENTITIES ----------------
+    def snapshot(obj):
+        """Values of obj.INTERP_ATTRS, for interpolating between physics steps."""
+        return tuple(getattr(obj, a) for a in obj.INTERP_ATTRS)
+
+    def lerp_state(obj, prev, alpha):
+        """Blend obj's INTERP_ATTRS from snapshot prev toward their current values.
+        Returns the current snapshot so the caller can restore it after drawing."""
+        cur = snapshot(obj)
+        for a, p, c in zip(obj.INTERP_ATTRS, prev, cur):
+            setattr(obj, a, p + (c - p) * alpha)
+        return cur
+
+    def restore_state(obj, state):
+        for a, v in zip(obj.INTERP_ATTRS, state):
+            setattr(obj, a, v)
+
     class Mario:
+        INTERP_ATTRS = ("x", "y", "z", "face_angle") # Blended between physics steps for drawing
+
         def __init__(self):
             self.x, self.y, self.z = 0, 0, 0 # Y is Up in 3D
             self.vel_fwd = 0
@@ -129,6 +366,8 @@
             self.face_angle = 0
             self.state = "IDLE" # IDLE, RUN, JUMP
             self.ground_y = 0
+            self.floors = None # FloorGrid of the current course; None keeps ground_y fixed
+            self.walls = None  # LevelBVH of the current course; None means no walls
 
         def update(self, keys):
             # Input Handling
@@ -167,6 +406,14 @@
             self.x += math.sin(self.face_angle) * self.vel_fwd
             self.z += math.cos(self.face_angle) * self.vel_fwd
 
+            # Walls push Mario back out sideways
+            if self.walls is not None:
+                self.x, self.z = self.walls.push_out(self.x, self.y, self.z)
+
+            # Floor under Mario (also where his shadow goes)
+            if self.floors is not None:
+                self.ground_y = self.floors.floor_y(self.x, self.y, self.z)
+
             # Jumping & Gravity
             if keys[pygame.K_SPACE] and self.y == self.ground_y:
                 self.vel_y = -JUMP_FORCE
@@ -182,53 +429,887 @@
                 self.state = "RUN" if self.vel_fwd > 1 else "IDLE"
 
         def draw(self, screen, cam):
-            # 3D Projection for Mario
-            proj = cam.project(self.x, self.y - 40, self.z) # -40 to center sprite vertically
-            if not proj: return
-            sx, sy, scale = proj
+            # 3D Projection for Mario and his shadow in one batch
+            xs, ys, scales, behind = cam.project_many([
+                (self.x, self.y - 40, self.z), # -40 to center sprite vertically
+                (self.x, self.ground_y - 2, self.z),
+            ])
+            if behind[0]: return
+            sx, sy, scale = xs[0], ys[0], scales[0]
             
             # Shadow projection
-            shadow_proj = cam.project(self.x, self.ground_y - 2, self.z)
-            if shadow_proj:
-                sh_x, sh_y, sh_scale = shadow_proj
-                # Draw shadow ellipse
-                sw, sh = 40 * sh_scale, 20 * sh_scale
-                s_surf = pygame.Surface((int(sw*2), int(sh*2)), pygame.SRCALPHA)
-                pygame.draw.ellipse(s_surf, SHADOW, (0, 0, sw, sh))
-                screen.blit(s_surf, (sh_x - sw//2, sh_y - sh//2))
-
-            # Simple Mario Shapes (Body + Hat)
+            if not behind[1]:
+                sh_x, sh_y, sh_scale = xs[1], ys[1], scales[1]
+                # Draw shadow ellipse (pooled sprite, no per-frame allocation)
+                s_surf = shadow_sprite(40 * sh_scale, 20 * sh_scale)
+                if s_surf is not None:
+                    screen.blit(s_surf, (sh_x - s_surf.get_width() // 2, sh_y - s_surf.get_height() // 2))
+                else:
+                    w, h = int(40 * sh_scale), int(20 * sh_scale)
+                    draw_shadow_direct(screen, pygame.Rect(int(sh_x) - w // 2, int(sh_y) - h // 2, w, h))
+
+            # Simple Mario Shapes (Body + Hat), pre-rasterized per size/facing bucket
             size = 60 * scale
-            
-            # Cap
-            pygame.draw.circle(screen, MARIO_RED, (sx, sy - size*0.4), size/2)
-            # Brim
-            brim_off_x = math.sin(self.face_angle - cam.yaw) * (size/3)
-            pygame.draw.circle(screen, MARIO_RED, (sx + brim_off_x, sy - size*0.3), size/2.5)
-            # Body
-            body_rect = pygame.Rect(sx - size/3, sy, size/1.5, size/1.5)
-            pygame.draw.rect(screen, MARIO_BLUE, body_rect, border_radius=4)
-            # Buttons
-            pygame.draw.circle(screen, (255,255,0), (sx - size/6, sy + size/4), size/10)
-            pygame.draw.circle(screen, (255,255,0), (sx + size/6, sy + size/4), size/10)
+            rel_angle = self.face_angle - cam.yaw
+            sprite = mario_sprite(size, rel_angle)
+            if sprite is None:
+                draw_mario_shapes(screen, sx, sy, size, math.sin(rel_angle) * (size/3))
+                return
+            surf, ax, ay = sprite
+            screen.blit(surf, (int(round(sx)) - ax, int(round(sy)) - ay))
 
     # ---------------- WORLD GEOMETRY ----------------
     class Polygon3D:
-        def __init__(self, points, color):
+        def __init__(self, points, color, lod=None):
             self.points = points # List of (x, y, z)
             self.color = color
+            self.lod = lod       # (LodObject, detail level) for one level of a multi-level object, else None
+            # Bounds for frustum culling: AABB plus the sphere around its center
+            self.aabb_min = tuple(min(p[i] for p in points) for i in range(3))
+            self.aabb_max = tuple(max(p[i] for p in points) for i in range(3))
+            self.center = tuple((lo + hi) / 2 for lo, hi in zip(self.aabb_min, self.aabb_max))
+            self.radius = max(math.dist(p, self.center) for p in points)
 
         def draw(self, screen, cam):
-            projected_points = []
-            for p in self.points:
-                proj = cam.project(p[0], p[1], p[2])
-                if not proj: return # Simple culling if any point is behind
-                projected_points.append((proj[0], proj[1]))
-            
-            pygame.draw.polygon(screen, self.color, projected_points)
+            draw_projected(screen, cam, self.points, self.color, cam.project_many(self.points), 0)
+
+    def draw_projected(screen, cam, points, color, proj, start):
+        """Fill one polygon whose vertices sit at proj[start:start + len(points)]."""
+        xs, ys, _, behind = proj
+        end = start + len(points)
+        if any(behind[start:end]):
+            # Straddles the near plane: clip in camera space rather than dropping it
+            if not isinstance(points, list):
+                points = points.tolist() # Mesh vertex rows: Python floats only for the few clipped polygons
+            view_points = clip_near([cam.to_view(*p) for p in points])
+            if len(view_points) < 3: return
+            projected_points = [cam.project_view(*v)[:2] for v in view_points]
+        else:
+            projected_points = list(zip(xs[start:end], ys[start:end]))
+        if any(abs(x - WIDTH / 2) > GUARD_BAND or abs(y - HEIGHT / 2) > GUARD_BAND for x, y in projected_points):
+            # Vertices close to the near plane land millions of pixels away; pygame's fill breaks there
+            projected_points = clip_screen(projected_points)
+            if len(projected_points) < 3: return
+        
+        pygame.draw.polygon(screen, color, projected_points)
+
+    def clip_screen(points):
+        """Sutherland-Hodgman clip of a 2D polygon to the screen grown by GUARD_BAND."""
+        for axis, limit, keep_below in ((0, WIDTH / 2 + GUARD_BAND, True), (0, WIDTH / 2 - GUARD_BAND, False),
+                                        (1, HEIGHT / 2 + GUARD_BAND, True), (1, HEIGHT / 2 - GUARD_BAND, False)):
+            clipped = []
+            for i, a in enumerate(points):
+                b = points[(i + 1) % len(points)]
+                a_in = a[axis] <= limit if keep_below else a[axis] >= limit
+                b_in = b[axis] <= limit if keep_below else b[axis] >= limit
+                if a_in:
+                    clipped.append(a)
+                if a_in != b_in:
+                    t = (limit - a[axis]) / (b[axis] - a[axis])
+                    clipped.append((a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t))
+            points = clipped
+            if not points:
+                break
+        return points
+
+    def clip_near(view_points):
+        """Sutherland-Hodgman clip of a camera-space polygon to rz > NEAR."""
+        clipped = []
+        for i, a in enumerate(view_points):
+            b = view_points[(i + 1) % len(view_points)]
+            a_in, b_in = a[2] > NEAR, b[2] > NEAR
+            if a_in:
+                clipped.append(a)
+            if a_in != b_in:
+                t = (NEAR - a[2]) / (b[2] - a[2])
+                clipped.append(tuple(a[k] + (b[k] - a[k]) * t for k in range(3)))
+        return clipped
+
+    # ---------------- LEVEL OF DETAIL ----------------
+    LOD_SIZE = 160        # Default projected diameter (pixels) below which an object drops one detail level
+    LOD_HYSTERESIS = 0.15 # How far (fraction) past a threshold the size must go before the level switches back
+
+    class LodObject:
+        """An object drawn at one of several detail levels (0 = finest): its bounding sphere and
+        sizes[k], the projected diameter in pixels below which level k gives way to level k + 1."""
+        def __init__(self, center, radius, sizes):
+            self.center = tuple(center)
+            self.radius = radius
+            self.sizes = tuple(sizes)
+
+        def moved(self, dx, dy, dz):
+            return LodObject((self.center[0] + dx, self.center[1] + dy, self.center[2] + dz), self.radius, self.sizes)
+
+    class LevelMesh:
+        """Struct-of-arrays level geometry: one vertex buffer plus per-polygon arrays.
+        Builders fill it like a list of Polygon3D (append/extend/add/add_lod); pack() freezes the
+        arrays (verts, starts, counts, colors, centroids, normals, centers, radii, and the
+        LOD tables lod_objects, lod_index, lod_level)."""
+        def __init__(self, polys=()):
+            self._points = [] # Flat (x, y, z) list while building
+            self._counts = []
+            self._colors = []
+            self._lods = []   # (LodObject, level) or None per polygon
+            self.packed = False
+            self.extend(polys)
+
+        def add(self, points, color, lod=None):
+            if not isinstance(self._points, list): # Growing a packed mesh again
+                self._points, self._counts = self._points.tolist(), [int(c) for c in self._counts]
+            self._points.extend(points)
+            self._counts.append(len(points))
+            self._colors.append(tuple(color))
+            self._lods.append(lod)
+            self.packed = False
+
+        def add_lod(self, levels, sizes=None):
+            """One object at several detail levels: lists of Polygon3D, finest first. sizes[k] is the
+            projected diameter (pixels) below which level k gives way to level k + 1; by default
+            LOD_SIZE, halving for each further level."""
+            points = [p for level in levels for poly in level for p in poly.points]
+            lo = [min(p[k] for p in points) for k in range(3)]
+            hi = [max(p[k] for p in points) for k in range(3)]
+            center = tuple((a + b) / 2 for a, b in zip(lo, hi))
+            if sizes is None:
+                sizes = [LOD_SIZE / 2 ** k for k in range(len(levels) - 1)]
+            obj = LodObject(center, max(math.dist(p, center) for p in points), sizes)
+            for k, level in enumerate(levels):
+                for poly in level:
+                    self.add(poly.points, poly.color, (obj, k))
+
+        def append(self, poly):
+            self.add(poly.points, poly.color, poly.lod)
+
+        def extend(self, polys):
+            for poly in polys:
+                self.append(poly)
+
+        def __len__(self):
+            return len(self._counts)
+
+        def points(self, i):
+            start = self._starts[i]
+            points = self._points[start:start + self._counts[i]]
+            if not isinstance(points, list):
+                points = points.tolist() # from_arrays mesh: plain floats, not float32 scalars
+            return points
+
+        def __iter__(self):
+            """Rebuild Polygon3D objects on demand (level tools, BSP construction)."""
+            self.pack()
+            for i, color in enumerate(self._colors):
+                yield Polygon3D(self.points(i), color, self._lods[i])
+
+        def pack(self):
+            if self.packed:
+                return self
+            self._starts, total = [], 0
+            for count in self._counts:
+                self._starts.append(total)
+                total += count
+            if np is None:
+                polys = [Polygon3D(self.points(i), c) for i, c in enumerate(self._colors)]
+                self.verts, self.starts, self.counts = self._points, self._starts, self._counts
+                self.colors = self._colors
+                self.centroids = [tuple(sum(p[k] for p in poly.points) / len(poly.points) for k in range(3)) for poly in polys]
+                self.normals = [(poly_plane(poly.points) or ((0.0, 0.0, 0.0), 0))[0] for poly in polys]
+                self.centers = [poly.center for poly in polys]
+                self.radii = [poly.radius for poly in polys]
+                self._pack_lods()
+                self.packed = True
+                return self
+            self.verts = np.array(self._points, dtype=np.float64).reshape(-1, 3)
+            self.starts = np.array(self._starts, dtype=np.int64)
+            self.counts = np.array(self._counts, dtype=np.int64)
+            # RGBA palette rows (alpha 255 unless the builder gave one)
+            self.colors = np.array([c + (255,) * (4 - len(c)) for c in self._colors], dtype=np.uint8).reshape(-1, 4)
+            self._derive()
+            self._pack_lods()
+            self._points = self.verts # points() slices the array; no second copy as Python lists
+            self.packed = True
+            return self
+
+        @classmethod
+        def from_arrays(cls, verts, starts, counts, colors, lods=None):
+            """Packed mesh over existing (e.g. memory-mapped) arrays without copying the vertices.
+            lods: optional (LodObject, level) or None per polygon."""
+            mesh = cls()
+            mesh.verts, mesh.starts, mesh.counts, mesh.colors = verts, starts, counts, colors
+            mesh._points, mesh._starts, mesh._counts = verts, starts, counts
+            mesh._colors = [tuple(c) for c in colors.tolist()]
+            mesh._lods = list(lods) if lods is not None else [None] * len(counts)
+            mesh._derive()
+            mesh._pack_lods()
+            mesh.packed = True
+            return mesh
+
+        def _pack_lods(self):
+            """LOD tables: lod_objects (distinct LodObjects), per polygon lod_index into them
+            (-1 = always drawn) and lod_level, plus per-object sphere/size arrays for lod_mask()."""
+            self.lod_objects, ids, index, level = [], {}, [], []
+            for lod in self._lods:
+                if lod is None:
+                    index.append(-1)
+                    level.append(0)
+                    continue
+                obj, k = lod
+                if id(obj) not in ids:
+                    ids[id(obj)] = len(self.lod_objects)
+                    self.lod_objects.append(obj)
+                index.append(ids[id(obj)])
+                level.append(k)
+            self.lod_current = None # Level each object showed last frame (hysteresis state)
+            if np is None:
+                self.lod_index, self.lod_level = index, level
+                return
+            self.lod_index = np.array(index, dtype=np.int64)
+            self.lod_level = np.array(level, dtype=np.int64)
+            n = max((len(obj.sizes) for obj in self.lod_objects), default=0)
+            self.lod_centers = np.array([obj.center for obj in self.lod_objects], dtype=np.float64).reshape(-1, 3)
+            self.lod_radii = np.array([obj.radius for obj in self.lod_objects], dtype=np.float64)
+            # Padded with 0: a size is never below it, so missing levels are never picked
+            self.lod_sizes = np.array([obj.sizes + (0.0,) * (n - len(obj.sizes)) for obj in self.lod_objects],
+                                      dtype=np.float64).reshape(len(self.lod_objects), n)
+
+        def lod_mask(self, cam):
+            """Per-polygon mask of the detail level each LOD object shows from cam, or None when the
+            mesh has no LOD objects. Level k shows while the object's projected diameter
+            (2 * radius * scale, scale = FOV / rz as in project_view) is at least sizes[k]; an
+            object only leaves its current level once the size is LOD_HYSTERESIS past the
+            threshold, so it does not flicker between levels. Without NumPy: finest level only."""
+            if not self.lod_objects:
+                return None
+            if np is None:
+                return [i < 0 or k == 0 for i, k in zip(self.lod_index, self.lod_level)]
+            _, _, rz = cam.view_many(self.lod_centers)
+            size = 2 * self.lod_radii * FOV / np.maximum(rz, NEAR)
+            target = (size[:, None] < self.lod_sizes).sum(axis=1)
+            if self.lod_current is None:
+                current = target
+            else:
+                # Thresholds around each current level: sizes[level - 1] above (inf at 0), sizes[level] below
+                bounds = np.concatenate([np.full((len(size), 1), np.inf), self.lod_sizes,
+                                         np.zeros((len(size), 1))], axis=1)
+                rows = np.arange(len(size))
+                stay = ((size <= bounds[rows, self.lod_current] * (1 + LOD_HYSTERESIS))
+                        & (size >= bounds[rows, self.lod_current + 1] * (1 - LOD_HYSTERESIS)))
+                current = np.where(stay, self.lod_current, target)
+            self.lod_current = current
+            return (self.lod_index < 0) | (self.lod_level == current[np.maximum(self.lod_index, 0)])
+
+        def _derive(self):
+            """Per-polygon centroids, normals, bounding spheres from verts/starts/counts (NumPy)."""
+            if not len(self.counts):
+                self.centroids = self.normals = self.centers = np.zeros((0, 3))
+                self.radii = np.zeros(0)
+                return
+            owner = np.repeat(np.arange(len(self.counts)), self.counts)
+            self.centroids = np.add.reduceat(self.verts, self.starts) / self.counts[:, None]
+            # Newell normals: sum over each edge (v, next v) of the polygon
+            nxt = np.arange(len(self.verts)) + 1
+            nxt[self.starts + self.counts - 1] = self.starts
+            a, b = self.verts, self.verts[nxt]
+            edge = np.stack([
+                (a[:, 1] - b[:, 1]) * (a[:, 2] + b[:, 2]),
+                (a[:, 2] - b[:, 2]) * (a[:, 0] + b[:, 0]),
+                (a[:, 0] - b[:, 0]) * (a[:, 1] + b[:, 1]),
+            ], axis=1)
+            normals = np.add.reduceat(edge, self.starts)
+            lengths = np.linalg.norm(normals, axis=1)
+            self.normals = normals / np.where(lengths < 1e-9, 1.0, lengths)[:, None]
+            lo = np.minimum.reduceat(self.verts, self.starts)
+            hi = np.maximum.reduceat(self.verts, self.starts)
+            self.centers = (lo + hi) / 2
+            self.radii = np.maximum.reduceat(np.linalg.norm(self.verts - self.centers[owner], axis=1), self.starts)
+
+        def vertex_mask(self, poly_mask):
+            """Expand a per-polygon mask to the vertex buffer (for Camera.project_many keep=)."""
+            if np is None:
+                return [m for m, count in zip(poly_mask, self.counts) for _ in range(count)]
+            return np.repeat(np.asarray(poly_mask, dtype=bool), self.counts)
+
+        def draw(self, screen, cam, proj, order):
+            """Fill polygons by index in the given (painter's) order."""
+            verts, starts, counts, colors = self.verts, self._starts, self._counts, self._colors
+            for i in order:
+                start = starts[i]
+                draw_projected(screen, cam, verts[start:start + counts[i]], colors[i], proj, start)
+
+    # ---------------- DRAW ORDER (BSP) ----------------
+    BSP_EPS = 0.01  # Points closer than this to a splitting plane count as on it
+
+    def poly_plane(points):
+        """Plane (unit normal, d) through a polygon via Newell's method; None if degenerate."""
+        nx = ny = nz = 0.0
+        for (x0, y0, z0), (x1, y1, z1) in zip(points, list(points[1:]) + [points[0]]):
+            nx += (y0 - y1) * (z0 + z1)
+            ny += (z0 - z1) * (x0 + x1)
+            nz += (x0 - x1) * (y0 + y1)
+        length = math.sqrt(nx * nx + ny * ny + nz * nz)
+        if length < 1e-9:
+            return None
+        nx, ny, nz = nx / length, ny / length, nz / length
+        x, y, z = points[0]
+        return (nx, ny, nz), -(nx * x + ny * y + nz * z)
+
+    def split_polygon(poly, normal, d):
+        """Classify poly against a plane: returns (front, back, coplanar) lists of polygons."""
+        nx, ny, nz = normal
+        dists = [nx * x + ny * y + nz * z + d for x, y, z in poly.points]
+        if all(abs(dist) <= BSP_EPS for dist in dists):
+            return [], [], [poly]
+        if all(dist >= -BSP_EPS for dist in dists):
+            return [poly], [], []
+        if all(dist <= BSP_EPS for dist in dists):
+            return [], [poly], []
+        front, back = [], []
+        count = len(poly.points)
+        for i, a in enumerate(poly.points):
+            b, da, db = poly.points[(i + 1) % count], dists[i], dists[(i + 1) % count]
+            if da >= -BSP_EPS:
+                front.append(a)
+            if da <= BSP_EPS:
+                back.append(a)
+            if (da > BSP_EPS and db < -BSP_EPS) or (da < -BSP_EPS and db > BSP_EPS):
+                t = da / (da - db)
+                mid = tuple(a[k] + (b[k] - a[k]) * t for k in range(3))
+                front.append(mid)
+                back.append(mid)
+        return ([Polygon3D(front, poly.color, poly.lod)] if len(front) >= 3 else [],
+                [Polygon3D(back, poly.color, poly.lod)] if len(back) >= 3 else [], [])
+
+    class BSPNode:
+        def __init__(self, plane):
+            self.plane = plane # (normal, d) or None for a leaf of degenerate polygons
+            self.polys = []    # Coplanar polygons in build order (mesh indices once built)
+            self.front = None
+            self.back = None
+
+    class BSPTree:
+        """Static BSP over a level's polygons, built once per load_level.
+        The fragments (straddling polygons get split) end up in self.mesh; back_to_front()
+        gives a painter's order of mesh indices for any eye position without sorting."""
+        SPLITTER_CANDIDATES = 8
+
+        def __init__(self, polys):
+            self.mesh = LevelMesh().pack()
+            self.root = None
+            if not polys:
+                return
+            work = [(None, None, list(polys))] # (parent, side, polys) - iterative to avoid deep recursion
+            while work:
+                parent, side, group = work.pop()
+                node = self._make_node(group)
+                if parent is None:
+                    self.root = node
+                else:
+                    setattr(parent, side, node)
+                if node.plane is None:
+                    node.polys = group
+                    continue
+                front, back = [], []
+                for poly in group:
+                    f, b, c = split_polygon(poly, *node.plane)
+                    front += f
+                    back += b
+                    node.polys += c
+                if front:
+                    work.append((node, "front", front))
+                if back:
+                    work.append((node, "back", back))
+            self.mesh = self._collect()
+
+        def _make_node(self, group):
+            """Pick the splitter among the first few candidates that causes the fewest splits."""
+            best, best_splits = None, None
+            for poly in group[:self.SPLITTER_CANDIDATES]:
+                plane = poly_plane(poly.points)
+                if plane is None:
+                    continue
+                splits = 0
+                for other in group:
+                    front, back, _ = split_polygon(other, *plane)
+                    splits += bool(front and back)
+                if best is None or splits < best_splits:
+                    best, best_splits = plane, splits
+            return BSPNode(best)
+
+        def _collect(self):
+            """Pack every fragment into one LevelMesh; nodes switch to indices into it."""
+            mesh, stack = LevelMesh(), [self.root]
+            while stack:
+                node = stack.pop()
+                if node is not None:
+                    first = len(mesh)
+                    mesh.extend(node.polys)
+                    node.polys = list(range(first, len(mesh)))
+                    stack += [node.back, node.front]
+            return mesh.pack()
+
+        @classmethod
+        def from_arrays(cls, mesh, planes, links):
+            """Rebuild a tree saved by export_course: planes rows (nx, ny, nz, d); links rows
+            (front, back, first poly, poly count, leaf) with -1 for a missing child; node 0 is the root."""
+            tree = cls(())
+            tree.mesh = mesh
+            nodes = []
+            for (nx, ny, nz, d), (_, _, first, count, leaf) in zip(planes.tolist(), links.tolist()):
+                node = BSPNode(None if leaf else ((nx, ny, nz), d))
+                node.polys = list(range(first, first + count))
+                nodes.append(node)
+            for node, (front, back, _, _, _) in zip(nodes, links.tolist()):
+                node.front = nodes[front] if front >= 0 else None
+                node.back = nodes[back] if back >= 0 else None
+            tree.root = nodes[0] if nodes else None
+            return tree
+
+        def back_to_front(self, x, y, z):
+            """Mesh indices ordered farthest-first as seen from (x, y, z)."""
+            order, stack = [], [self.root]
+            while stack:
+                item = stack.pop()
+                if item is None:
+                    continue
+                if isinstance(item, list):
+                    order += item
+                    continue
+                if item.plane is None:
+                    order += item.polys
+                    continue
+                (nx, ny, nz), d = item.plane
+                if nx * x + ny * y + nz * z + d >= 0:
+                    stack += [item.front, item.polys, item.back] # back is popped (drawn) first
+                else:
+                    stack += [item.back, item.polys, item.front]
+            return order
+
+    # ---------------- FLOOR COLLISION ----------------
+    FLOOR_CELL = 200      # Spatial hash cell size in world x/z units
+    FLOOR_MIN_NY = 0.7    # Polygons with |normal y| at least this are walkable (up to ~45 degrees)
+    FLOOR_STEP = 10       # Floors at most this far above the feet still catch Mario (kerbs, ramps)
+
+    def point_in_polygon(x, z, xz):
+        """Even-odd test of (x, z) against a polygon's x/z outline."""
+        inside = False
+        for (x0, z0), (x1, z1) in zip(xz, xz[1:] + xz[:1]):
+            if (z0 > z) != (z1 > z) and x < x0 + (z - z0) * (x1 - x0) / (z1 - z0):
+                inside = not inside
+        return inside
+
+    class FloorGrid:
+        """Walkable polygons of a level bucketed in a uniform x/z hash, built once per load.
+        A query only tests the polygons registered in its cell. Below everything lies the
+        course's base plane at base_y (the LEVELS ground height). Y is down: higher floors
+        have smaller y."""
+        def __init__(self, mesh, base_y, cell=FLOOR_CELL):
+            self.base_y = base_y
+            self.cell = cell
+            self.cells = {}  # (cx, cz) -> indices into self.floors
+            self.floors = [] # (x/z outline, (nx, ny, nz), d) per walkable polygon
+            for poly in mesh:
+                plane = poly_plane(poly.points)
+                if plane is None or abs(plane[0][1]) < FLOOR_MIN_NY:
+                    continue
+                xz = [(x, z) for x, _, z in poly.points]
+                k = len(self.floors)
+                self.floors.append((xz, plane[0], plane[1]))
+                for cx in range(math.floor(min(x for x, _ in xz) / cell), math.floor(max(x for x, _ in xz) / cell) + 1):
+                    for cz in range(math.floor(min(z for _, z in xz) / cell), math.floor(max(z for _, z in xz) / cell) + 1):
+                        self.cells.setdefault((cx, cz), []).append(k)
+
+        def find_floor(self, x, y, z, step=FLOOR_STEP):
+            """(floor y, floor index) of the highest walkable polygon under (x, z) no more than
+            step above y, or (base_y, None) when only the base plane is there."""
+            best, best_k = self.base_y, None
+            for k in self.cells.get((math.floor(x / self.cell), math.floor(z / self.cell)), ()):
+                xz, (nx, ny, nz), d = self.floors[k]
+                if not point_in_polygon(x, z, xz):
+                    continue
+                floor_y = -(nx * x + nz * z + d) / ny
+                if y - step <= floor_y < best:
+                    best, best_k = floor_y, k
+            return best, best_k
+
+        def floor_y(self, x, y, z, step=FLOOR_STEP):
+            return self.find_floor(x, y, z, step)[0]
+
+    # ---------------- WALL COLLISION (BVH) ----------------
+    BVH_LEAF_SIZE = 4        # Polygons per BVH leaf
+    WALL_RADIUS = 50         # Mario's horizontal collision radius against walls
+    WALL_HEIGHTS = (30, 60)  # Heights above the feet where walls are checked (like SM64's two wall checks)
+    SWEEP_SAMPLES = 2        # Sphere sweep samples per radius of travel before bisection
+
+    def inside_polygon(q, points, normal):
+        """Whether q, a point on a polygon's plane, lies inside it (tested on the two non-dominant axes)."""
+        ax = max(range(3), key=lambda k: abs(normal[k]))
+        u, v = [k for k in range(3) if k != ax]
+        return point_in_polygon(q[u], q[v], [(a[u], a[v]) for a in points])
+
+    def closest_point_on_polygon(p, points, normal, d):
+        """Point of a planar polygon nearest to p (plane projection if inside, else nearest edge point)."""
+        dist = normal[0] * p[0] + normal[1] * p[1] + normal[2] * p[2] + d
+        q = (p[0] - normal[0] * dist, p[1] - normal[1] * dist, p[2] - normal[2] * dist)
+        if inside_polygon(q, points, normal):
+            return q
+        best, best_d2 = None, None
+        for a, b in zip(points, points[1:] + points[:1]):
+            ab = [b[k] - a[k] for k in range(3)]
+            ab2 = sum(c * c for c in ab)
+            t = 0.0 if ab2 == 0 else max(0.0, min(1.0, sum((p[k] - a[k]) * ab[k] for k in range(3)) / ab2))
+            c = tuple(a[k] + ab[k] * t for k in range(3))
+            d2 = sum((p[k] - c[k]) ** 2 for k in range(3))
+            if best is None or d2 < best_d2:
+                best, best_d2 = c, d2
+        return best
+
+    class LevelBVH:
+        """Bounding volume hierarchy over a level's polygons, built once per load (median split
+        on the longest axis). Answers box queries, raycasts, sphere sweeps and wall push-out
+        in O(log n) node visits. Y is down."""
+        def __init__(self, mesh, leaf_size=BVH_LEAF_SIZE):
+            self.polys = [] # (points, normal, d, lo, hi)
+            for poly in mesh:
+                plane = poly_plane(poly.points)
+                if plane is None:
+                    continue
+                pts = [tuple(p) for p in poly.points]
+                self.polys.append((pts, plane[0], plane[1],
+                                   tuple(min(q[k] for q in pts) for k in range(3)),
+                                   tuple(max(q[k] for q in pts) for k in range(3))))
+            self.order = list(range(len(self.polys)))
+            self.nodes = [] # [lo, hi, left, right, first, count]; leaves have left = -1
+            if not self.polys:
+                return
+            work = [(self._new_node(0, len(self.order)), 0, len(self.order))] # Iterative, like BSPTree
+            while work:
+                node, first, count = work.pop()
+                if count <= leaf_size:
+                    continue
+                lo, hi = self.nodes[node][:2]
+                axis = max(range(3), key=lambda k: hi[k] - lo[k])
+                self.order[first:first + count] = sorted(self.order[first:first + count],
+                                                         key=lambda i: self.polys[i][3][axis] + self.polys[i][4][axis])
+                half = count // 2
+                left = self._new_node(first, half)
+                right = self._new_node(first + half, count - half)
+                self.nodes[node][2:4] = [left, right]
+                work += [(left, first, half), (right, first + half, count - half)]
+
+        def _new_node(self, first, count):
+            members = [self.polys[i] for i in self.order[first:first + count]]
+            lo = tuple(min(p[3][k] for p in members) for k in range(3))
+            hi = tuple(max(p[4][k] for p in members) for k in range(3))
+            self.nodes.append([lo, hi, -1, -1, first, count])
+            return len(self.nodes) - 1
+
+        def query(self, lo, hi):
+            """Indices of polygons whose bounds overlap the box lo..hi."""
+            out, stack = [], [0] if self.nodes else []
+            while stack:
+                nlo, nhi, left, right, first, count = self.nodes[stack.pop()]
+                if any(nlo[k] > hi[k] or nhi[k] < lo[k] for k in range(3)):
+                    continue
+                if left < 0:
+                    out += [i for i in self.order[first:first + count]
+                            if all(self.polys[i][3][k] <= hi[k] and self.polys[i][4][k] >= lo[k] for k in range(3))]
+                else:
+                    stack += [left, right]
+            return out
+
+        def raycast(self, origin, direction, max_t=math.inf):
+            """(t, polygon index) of the first hit along origin + t * direction, or None."""
+            inv = [1 / c if c != 0 else math.inf for c in direction]
+            best, stack = None, [0] if self.nodes else []
+            while stack:
+                nlo, nhi, left, right, first, count = self.nodes[stack.pop()]
+                # Slab test against the node box
+                t0, t1 = 0.0, max_t if best is None else best[0]
+                for k in range(3):
+                    if direction[k] == 0:
+                        if not nlo[k] <= origin[k] <= nhi[k]:
+                            t0 = math.inf
+                        continue
+                    a, b = (nlo[k] - origin[k]) * inv[k], (nhi[k] - origin[k]) * inv[k]
+                    t0, t1 = max(t0, min(a, b)), min(t1, max(a, b))
+                if t0 > t1:
+                    continue
+                if left >= 0:
+                    stack += [left, right]
+                    continue
+                for i in self.order[first:first + count]:
+                    pts, n, d, _, _ = self.polys[i]
+                    denom = n[0] * direction[0] + n[1] * direction[1] + n[2] * direction[2]
+                    if denom == 0:
+                        continue
+                    t = -(n[0] * origin[0] + n[1] * origin[1] + n[2] * origin[2] + d) / denom
+                    if t < 0 or t > (max_t if best is None else best[0]):
+                        continue
+                    if inside_polygon([origin[k] + direction[k] * t for k in range(3)], pts, n):
+                        best = (t, i)
+            return best
+
+        def sweep_sphere(self, start, end, radius):
+            """(t in [0, 1], polygon index) where a sphere moving start -> end first touches a
+            polygon, or None. Samples the path then bisects to sub-unit precision."""
+            lo = tuple(min(start[k], end[k]) - radius for k in range(3))
+            hi = tuple(max(start[k], end[k]) + radius for k in range(3))
+            candidates = self.query(lo, hi)
+            if not candidates:
+                return None
+            path = [end[k] - start[k] for k in range(3)]
+            length = math.sqrt(sum(c * c for c in path))
+
+            def touching(t):
+                c = tuple(start[k] + path[k] * t for k in range(3))
+                for i in candidates:
+                    pts, n, d, _, _ = self.polys[i]
+                    q = closest_point_on_polygon(c, pts, n, d)
+                    if sum((c[k] - q[k]) ** 2 for k in range(3)) <= radius * radius:
+                        return i
+                return None
+
+            samples = max(1, math.ceil(length / radius * SWEEP_SAMPLES))
+            prev = 0.0
+            for s in range(samples + 1):
+                t = s / samples
+                hit = touching(t)
+                if hit is None:
+                    prev = t
+                    continue
+                if t == 0:
+                    return 0.0, hit
+                a, b = prev, t
+                while (b - a) * length > 0.01:
+                    mid = (a + b) / 2
+                    if touching(mid) is None:
+                        a = mid
+                    else:
+                        b = mid
+                return b, touching(b)
+            return None
+
+        def push_out(self, x, y, z, radius=WALL_RADIUS, heights=WALL_HEIGHTS):
+            """(x, z) moved horizontally out of every wall within radius at the given heights above the feet y."""
+            for h in heights:
+                cy = y - h
+                for i in self.query((x - radius, cy, z - radius), (x + radius, cy, z + radius)):
+                    pts, (nx, ny, nz), d, _, _ = self.polys[i]
+                    if abs(ny) >= FLOOR_MIN_NY:
+                        continue # Floors and ceilings are not walls
+                    horizontal = math.hypot(nx, nz)
+                    dist = (nx * x + ny * cy + nz * z + d) / horizontal # Horizontal distance to the plane
+                    if abs(dist) >= radius:
+                        continue
+                    # Only inside the wall's extent (projected onto its plane)
+                    off = dist * horizontal
+                    if not inside_polygon((x - nx * off, cy - ny * off, z - nz * off), pts, (nx, ny, nz)):
+                        continue
+                    push = (radius - abs(dist)) * (1 if dist >= 0 else -1) / horizontal
+                    x += nx * push
+                    z += nz * push
+            return x, z
+
+    class CourseCollision:
+        """Collision for one course, built once per course with its geometry: the builder's polygons
+        minus the base quad (the ground_y plane stands in for it) at their finest LOD level, a
+        FloorGrid over them and a LevelBVH. The same polygons whatever the render options, so
+        rendering never changes physics."""
+        def __init__(self, mesh, ground_y):
+            self.mesh = LevelMesh(poly for poly in mesh if poly.lod is None or poly.lod[1] == 0).pack()
+            self.ground_y = ground_y
+            self.floors = FloorGrid(self.mesh, ground_y)
+            self.walls = LevelBVH(self.mesh)
+
+    COLLISION_CACHE = {} # LEVELS index -> CourseCollision for headless runs
+
+    def level_collision(idx):
+        """CourseCollision of LEVELS[idx] for headless runs; the builder runs once per process."""
+        if idx not in COLLISION_CACHE:
+            COLLISION_CACHE[idx] = CourseCollision(split_base(LEVELS[idx][1]())[1], LEVELS[idx][5])
+        return COLLISION_CACHE[idx]
+
+    # ---------------- Z-BUFFER BACKEND ----------------
+    class ZBufferRenderer:
+        """Software rasterizer: per-pixel 1/z depth test into NumPy buffers, shown via surfarray.
+        Polygons can be filled in any order, so intersecting geometry resolves correctly.
+        Depth and raster math run in float32; polygons whose screen rectangle is already covered
+        by nearer depth are skipped before any per-pixel work."""
+        TIE_EPS = 1e-5 # Relative 1/z difference treated as the same surface (a few float32 ulps)
+        def __init__(self, width=WIDTH, height=HEIGHT):
+            self.size = (width, height)
+            # surfarray layout is [x, y]
+            self.color = np.zeros((width, height, 3), dtype=np.uint8)
+            self.inv_depth = np.zeros((width, height), dtype=np.float32) # 1/rz; 0 = infinitely far
+
+        def render(self, screen, cam, mesh, polys, background, floor=None):
+            """Clear to background (or a Mode7Floor pass), fill the given mesh polygon indices, blit."""
+            self.clear(cam, background, floor)
+            self.fill_mesh(cam, mesh, polys)
+            self.present(screen)
+
+        def clear(self, cam, background, floor=None):
+            if floor is not None:
+                floor.render(cam, self.color, self.inv_depth, background)
+            else:
+                self.color[:] = background[:3]
+                self.inv_depth.fill(0)
+
+        def fill_mesh(self, cam, mesh, polys):
+            """Depth-test the given mesh polygon indices into the buffers (any order, any number of meshes)."""
+            rx, ry, rz = cam.view_many(mesh.verts)
+            for i in polys:
+                start, end = mesh.starts[i], mesh.starts[i] + mesh.counts[i]
+                view_points = list(zip(rx[start:end].tolist(), ry[start:end].tolist(), rz[start:end].tolist()))
+                if rz[start:end].min() <= NEAR:
+                    view_points = clip_near(view_points)
+                if len(view_points) >= 3:
+                    self.fill(cam, view_points, mesh.colors[i, :3])
+
+        def present(self, screen):
+            pygame.surfarray.blit_array(screen, self.color)
+
+        def fill(self, cam, view_points, color):
+            """Scanline-fill one convex camera-space polygon, all rows and columns at once."""
+            plane = poly_plane(view_points)
+            if plane is None:
+                return
+            (nx, ny, nz), d = plane
+            if abs(d) < 1e-6: # Plane passes through the eye: seen edge-on
+                return
+            screen_points = [cam.project_view(*v)[:2] for v in view_points]
+            w, h = self.size
+            x0 = max(0, math.floor(min(p[0] for p in screen_points)))
+            x1 = min(w, math.ceil(max(p[0] for p in screen_points)))
+            y0 = max(0, math.floor(min(p[1] for p in screen_points)))
+            y1 = min(h, math.ceil(max(p[1] for p in screen_points)))
+            if x0 >= x1 or y0 >= y1:
+                return
+            depth = self.inv_depth[x0:x1, y0:y1]
+            # 1/rz over a convex polygon peaks at a vertex: skip it if every pixel of its rectangle is nearer
+            if depth.min() * (1 - self.TIE_EPS) > 1 / min(v[2] for v in view_points):
+                return
+            # Span [left, right) of every scanline from the edges crossing it (pixel centers)
+            rows = np.arange(y0, y1, dtype=np.float32) + 0.5
+            left = np.full(len(rows), np.inf, dtype=np.float32)
+            right = np.full(len(rows), -np.inf, dtype=np.float32)
+            for (ax, ay), (bx, by) in zip(screen_points, screen_points[1:] + screen_points[:1]):
+                if ay == by:
+                    continue
+                t = (rows - ay) / (by - ay)
+                crosses = (t >= 0) & (t <= 1)
+                xi = ax + t * (bx - ax)
+                left = np.where(crosses, np.minimum(left, xi), left)
+                right = np.where(crosses, np.maximum(right, xi), right)
+            cols = np.arange(x0, x1, dtype=np.float32) + 0.5
+            inside = (cols[:, None] >= left[None, :]) & (cols[:, None] < right[None, :])
+            # 1/rz is affine in screen space: camera-space point = rz * ((sx-cx)/FOV, (sy-cy)/FOV, 1)
+            du, dv = -nx / (FOV * d), -ny / (FOV * d)
+            inv = (cols * du + (-nz / d - du * (WIDTH // 2) - dv * (HEIGHT // 2)))[:, None] + (rows * dv)[None, :]
+            # Coplanar ties (decals like paths on grass) go to the later polygon
+            nearer = inside & (inv >= depth * (1 - self.TIE_EPS))
+            depth[nearer] = inv[nearer]
+            self.color[x0:x1, y0:y1][nearer] = color
+
+    # ---------------- MODE 7 FLOOR ----------------
+    MODE7_TEXEL = 25         # World units per ground texel
+    MODE7_TEXTURE_SIZE = 64  # Texels per side; power of two so it tiles with a mask
+    MODE7_PIXEL = 2          # Painter path: screen pixels per floor sample side (scaled up in one blit)
+
+    def make_ground_texture(color, size=MODE7_TEXTURE_SIZE, seed=64):
+        """Procedural tiling ground texture: checkered base color with speckle noise."""
+        rng = np.random.default_rng(seed)
+        u, v = np.meshgrid(np.arange(size), np.arange(size), indexing="ij")
+        shade = 1 + ((u // 8 + v // 8) % 2) * 0.12 - 0.06 + rng.uniform(-0.08, 0.08, (size, size))
+        return np.clip(np.array(color[:3], dtype=np.float64) * shade[..., None], 0, 255).astype(np.uint8)
+
+    class Mode7Floor:
+        """Infinite textured ground plane at height y, sampled per scanline (NumPy only).
+        Cost is one pass over the screen no matter how large the course is; the painter path
+        samples every MODE7_PIXEL pixels and scales the result up."""
+        def __init__(self, y, color):
+            self.y = y
+            self.base_color = tuple(color[:3])
+            self.texture = make_ground_texture(color)
+            # Own reduced-resolution target for the painter path
+            self.color = np.zeros((WIDTH // MODE7_PIXEL, HEIGHT // MODE7_PIXEL, 3), dtype=np.uint8)
+            self.surface = None
+            self.rows_key = None # (pitch, camera y, pixel size) the cached scanline terms are for
+            self.rows = None     # (r0, r1, t, texel distance, depth dz) of the floor band
+            self.cols = {}       # Pixel size -> column ray x vector
+
+        def draw(self, screen, cam, background=SKY_BLUE):
+            """Sky + floor over the whole screen at reduced resolution (painter path)."""
+            self.render(cam, self.color, None, background)
+            if self.surface is None:
+                self.surface = pygame.Surface(self.color.shape[:2], 0, screen)
+            pygame.surfarray.blit_array(self.surface, self.color)
+            pygame.transform.scale(self.surface, screen.get_size(), screen)
+
+        def _scanlines(self, cam, height, pixel):
+            """Floor band rows and their per-row terms; they depend only on pitch and camera height."""
+            key = (cam.pitch, cam.y, pixel)
+            if key != self.rows_key:
+                # Camera-space ray through each pixel center is ((col-cx)/FOV, (row-cy)/FOV, 1).
+                # Undoing pitch only mixes row and depth, so the plane hit distance t is per scanline.
+                sp, cp = math.sin(-cam.pitch), math.cos(-cam.pitch)
+                rows = ((np.arange(height) + 0.5) * pixel - HEIGHT // 2) / FOV
+                world_dy = rows * cp + sp
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    t = (self.y - cam.y) / world_dy
+                hit = np.flatnonzero(np.isfinite(t) & (t > 0))
+                r0, r1 = (hit[0], hit[-1] + 1) if len(hit) else (height, height) # One contiguous band
+                t = t[r0:r1]
+                dz = (cp - rows[r0:r1] * sp).astype(np.float32)
+                self.rows_key = key
+                self.rows = (r0, r1, t, (t / MODE7_TEXEL).astype(np.float32), dz)
+            return self.rows
+
+        def render(self, cam, color, inv_depth=None, background=SKY_BLUE):
+            """Write sky + floor into a surfarray-layout color buffer (and 1/z into inv_depth).
+            The buffer may be the screen size divided by a whole pixel size."""
+            width, height = color.shape[:2]
+            pixel = WIDTH // width
+            sy_, cy = math.sin(-cam.yaw), math.cos(-cam.yaw)
+            r0, r1, t, tt, dz = self._scanlines(cam, height, pixel)
+            # Sky only where there is no floor
+            color[:, :r0] = background[:3]
+            color[:, r1:] = background[:3]
+            if inv_depth is not None:
+                inv_depth[:, :r0] = 0
+                inv_depth[:, r1:] = 0
+            if r0 == r1:
+                return
+            # Undo yaw: world x/z (in texels) are affine in the column along each scanline
+            cols = self.cols.get(pixel)
+            if cols is None:
+                cols = self.cols[pixel] = (((np.arange(width) + 0.5) * pixel - WIDTH // 2) / FOV).astype(np.float32)[:, None]
+            u = cam.x / MODE7_TEXEL + tt * (cols * np.float32(cy) + dz * np.float32(sy_))
+            v = cam.z / MODE7_TEXEL + tt * (dz * np.float32(cy) - cols * np.float32(sy_))
+            # Wrap into the tiling texture and gather through one flat texel index
+            size = MODE7_TEXTURE_SIZE
+            texel = np.floor(u, out=u).astype(np.int32) & (size - 1)
+            texel *= size
+            texel += np.floor(v, out=v).astype(np.int32) & (size - 1)
+            color[:, r0:r1] = np.take(self.texture.reshape(-1, 3), texel, axis=0)
+            if inv_depth is not None:
+                inv_depth[:, r0:r1] = 1 / t # Camera-space depth along the ray equals t
+
+    def split_base(mesh):
+        """(base polygon or None, remaining mesh): the builder's first polygon (the large base quad) when it is horizontal."""
+        polys = list(mesh)
+        if not polys or len({p[1] for p in polys[0].points}) != 1:
+            return None, mesh
+        return polys[0], LevelMesh(polys[1:])
+
+    def extract_floor(mesh):
+        """Split a builder's LevelMesh into (Mode7Floor, remaining mesh)."""
+        base, rest = split_base(mesh)
+        if base is None:
+            return None, mesh
+        return Mode7Floor(base.points[0][1], base.color), rest
 
     def build_castle_grounds():
-        polys = []
+        polys = LevelMesh()
         
         # 1. Main Grass Field (Large base)
         polys.append(Polygon3D([(-1000, 0, -1000), (1000, 0, -1000), (1000, 0, 1000), (-1000, 0, 1000)], GRASS_GREEN))
@@ -246,25 +1327,29 @@
         cw, ch, cd = 300, 300, -600
         polys.append(Polygon3D([(-cw, 0, cd), (cw, 0, cd), (cw, -ch, cd), (-cw, -ch, cd)], CASTLE_WHITE))
         
-        # 6. Castle Tower (Central)
+        # 6. Castle Tower (Central) and 7. Roof; far away, one silhouette polygon
         tw, th = 100, 450
-        polys.append(Polygon3D([(-tw, -ch, cd), (tw, -ch, cd), (tw, -th, cd), (-tw, -th, cd)], CASTLE_WHITE))
-        
-        # 7. Roof
-        polys.append(Polygon3D([(-tw-20, -th, cd), (tw+20, -th, cd), (0, -th-100, cd)], ROOF_RED))
+        polys.add_lod([
+            [Polygon3D([(-tw, -ch, cd), (tw, -ch, cd), (tw, -th, cd), (-tw, -th, cd)], CASTLE_WHITE),
+             Polygon3D([(-tw-20, -th, cd), (tw+20, -th, cd), (0, -th-100, cd)], ROOF_RED)],
+            [Polygon3D([(-tw, -ch, cd), (tw, -ch, cd), (tw, -th, cd), (0, -th-100, cd), (-tw, -th, cd)], CASTLE_WHITE)],
+        ])
 
         return polys
 
     def build_bobomb_battlefield():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-800, 0, -800), (800, 0, -800), (800, 0, 800), (-800, 0, 800)], GRASS_GREEN))
         polys.append(Polygon3D([(-200, 0, -200), (200, 0, -200), (200, 0, 200), (-200, 0, 200)], PATH_TAN))
-        polys.append(Polygon3D([(-80, 0, 100), (80, 0, 100), (80, 80, 100), (-80, 80, 100)], CASTLE_WHITE))
-        polys.append(Polygon3D([(-80, 80, 100), (80, 80, 100), (0, 120, 100)], ROOF_RED))
+        polys.add_lod([
+            [Polygon3D([(-80, 0, 100), (80, 0, 100), (80, 80, 100), (-80, 80, 100)], CASTLE_WHITE),
+             Polygon3D([(-80, 80, 100), (80, 80, 100), (0, 120, 100)], ROOF_RED)],
+            [Polygon3D([(-80, 0, 100), (80, 0, 100), (80, 80, 100), (0, 120, 100), (-80, 80, 100)], CASTLE_WHITE)],
+        ])
         return polys
 
     def build_whomps_fortress():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-600, 0, -600), (600, 0, -600), (600, 0, 600), (-600, 0, 600)], GRASS_GREEN))
         polys.append(Polygon3D([(-250, 0, -250), (250, 0, -250), (250, 0, 250), (-250, 0, 250)], WOOD_BROWN))
         polys.append(Polygon3D([(-200, 0, 0), (200, 0, 0), (200, 200, 0), (-200, 200, 0)], CASTLE_WHITE))
@@ -272,7 +1357,7 @@
         return polys
 
     def build_jolly_roger_bay():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-700, 0, -700), (700, 0, -700), (700, 0, 700), (-700, 0, 700)], (40, 80, 120)))
         polys.append(Polygon3D([(-300, 5, -300), (300, 5, -300), (300, 5, 300), (-300, 5, 300)], WATER_BLUE[:3]))
         polys.append(Polygon3D([(-150, 10, -100), (150, 10, -100), (150, 10, 100), (-150, 10, 100)], SAND_TAN))
@@ -280,15 +1365,18 @@
         return polys
 
     def build_cool_cool_mountain():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-800, 0, -800), (800, 0, -800), (800, 0, 800), (-800, 0, 800)], SNOW_WHITE))
         polys.append(Polygon3D([(-200, 0, -200), (200, 0, -200), (200, 0, 200), (-200, 0, 200)], (200, 220, 240)))
-        polys.append(Polygon3D([(-100, 0, 150), (100, 0, 150), (100, 150, 150), (-100, 150, 150)], CASTLE_WHITE))
-        polys.append(Polygon3D([(-100, 150, 150), (100, 150, 150), (0, 200, 150)], ROOF_RED))
+        polys.add_lod([
+            [Polygon3D([(-100, 0, 150), (100, 0, 150), (100, 150, 150), (-100, 150, 150)], CASTLE_WHITE),
+             Polygon3D([(-100, 150, 150), (100, 150, 150), (0, 200, 150)], ROOF_RED)],
+            [Polygon3D([(-100, 0, 150), (100, 0, 150), (100, 150, 150), (0, 200, 150), (-100, 150, 150)], CASTLE_WHITE)],
+        ])
         return polys
 
     def build_big_boos_haunt():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-600, 0, -600), (600, 0, -600), (600, 0, 600), (-600, 0, 600)], CAVE_GRAY))
         polys.append(Polygon3D([(-200, 0, -200), (200, 0, -200), (200, 0, 200), (-200, 0, 200)], BOO_PURPLE))
         polys.append(Polygon3D([(-120, 0, 0), (120, 0, 0), (120, 120, 0), (-120, 120, 0)], (60, 40, 80)))
@@ -296,7 +1384,7 @@
         return polys
 
     def build_hazy_maze_cave():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-700, 0, -700), (700, 0, -700), (700, 0, 700), (-700, 0, 700)], CAVE_GRAY))
         polys.append(Polygon3D([(-300, 0, -300), (300, 0, -300), (300, 0, 300), (-300, 0, 300)], (70, 75, 85)))
         polys.append(Polygon3D([(-150, 0, 100), (150, 0, 100), (150, 80, 100), (-150, 80, 100)], WOOD_BROWN))
@@ -304,7 +1392,7 @@
         return polys
 
     def build_lethal_lava_land():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-700, 0, -700), (700, 0, -700), (700, 0, 700), (-700, 0, 700)], (50, 30, 30)))
         polys.append(Polygon3D([(-400, 15, -400), (400, 15, -400), (400, 15, 400), (-400, 15, 400)], LAVA_RED))
         polys.append(Polygon3D([(-180, 15, -180), (180, 15, -180), (180, 15, 180), (-180, 15, 180)], WOOD_BROWN))
@@ -312,7 +1400,7 @@
         return polys
 
     def build_shifting_sand_land():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-800, 0, -800), (800, 0, -800), (800, 0, 800), (-800, 0, 800)], SAND_TAN))
         polys.append(Polygon3D([(-250, 0, -250), (250, 0, -250), (250, 0, 250), (-250, 0, 250)], (200, 160, 100)))
         polys.append(Polygon3D([(-100, 0, 120), (100, 0, 120), (100, 100, 120), (-100, 100, 120)], CASTLE_WHITE))
@@ -320,7 +1408,7 @@
         return polys
 
     def build_dire_dire_docks():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-700, 0, -700), (700, 0, -700), (700, 0, 700), (-700, 0, 700)], (30, 60, 120)))
         polys.append(Polygon3D([(-350, 8, -350), (350, 8, -350), (350, 8, 350), (-350, 8, 350)], (50, 100, 200)))
         polys.append(Polygon3D([(-120, 8, -120), (120, 8, -120), (120, 8, 120), (-120, 8, 120)], PATH_TAN))
@@ -328,7 +1416,7 @@
         return polys
 
     def build_snowmans_land():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-800, 0, -800), (800, 0, -800), (800, 0, 800), (-800, 0, 800)], SNOW_WHITE))
         polys.append(Polygon3D([(-220, 0, -220), (220, 0, -220), (220, 0, 220), (-220, 0, 220)], (220, 240, 255)))
         polys.append(Polygon3D([(-100, 0, 150), (100, 0, 150), (100, 100, 150), (-100, 100, 150)], CASTLE_WHITE))
@@ -336,7 +1424,7 @@
         return polys
 
     def build_wet_dry_world():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-700, 0, -700), (700, 0, -700), (700, 0, 700), (-700, 0, 700)], (100, 120, 80)))
         polys.append(Polygon3D([(-300, 5, -300), (300, 5, -300), (300, 5, 300), (-300, 5, 300)], (60, 100, 180)))
         polys.append(Polygon3D([(-150, 5, -150), (150, 5, -150), (150, 5, 150), (-150, 5, 150)], SAND_TAN))
@@ -344,7 +1432,7 @@
         return polys
 
     def build_tall_tall_mountain():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-800, 0, -800), (800, 0, -800), (800, 0, 800), (-800, 0, 800)], GRASS_GREEN))
         polys.append(Polygon3D([(-300, 0, -300), (300, 0, -300), (300, 0, 300), (-300, 0, 300)], (80, 140, 80)))
         polys.append(Polygon3D([(-120, 0, 200), (120, 0, 200), (120, 250, 200), (-120, 250, 200)], CASTLE_WHITE))
@@ -353,7 +1441,7 @@
         return polys
 
     def build_tiny_huge_island():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-600, 0, -600), (600, 0, -600), (600, 0, 600), (-600, 0, 600)], GRASS_GREEN))
         polys.append(Polygon3D([(-200, 0, -200), (200, 0, -200), (200, 0, 200), (-200, 0, 200)], (60, 130, 60)))
         polys.append(Polygon3D([(-100, 0, 100), (100, 0, 100), (100, 120, 100), (-100, 120, 100)], CASTLE_WHITE))
@@ -361,7 +1449,7 @@
         return polys
 
     def build_tick_tock_clock():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-500, 0, -500), (500, 0, -500), (500, 0, 500), (-500, 0, 500)], CAVE_GRAY))
         polys.append(Polygon3D([(-200, 0, -200), (200, 0, -200), (200, 0, 200), (-200, 0, 200)], (100, 100, 110)))
         polys.append(Polygon3D([(-80, 0, 0), (80, 0, 0), (80, 100, 0), (-80, 100, 0)], WOOD_BROWN))
@@ -369,7 +1457,7 @@
         return polys
 
     def build_rainbow_ride():
-        polys = []
+        polys = LevelMesh()
         polys.append(Polygon3D([(-700, 0, -700), (700, 0, -700), (700, 0, 700), (-700, 0, 700)], SKY_BLUE))
         polys.append(Polygon3D([(-300, 50, -300), (300, 50, -300), (300, 50, 300), (-300, 50, 300)], RAINBOW_PINK))
         polys.append(Polygon3D([(-100, 50, 0), (100, 50, 0), (100, 150, 0), (-100, 150, 0)], (255, 200, 220)))
@@ -396,16 +1484,411 @@
         ("Rainbow Ride", build_rainbow_ride, 0, 60, 0, 50),
     ]
 
+    def spawn(mario, cam, idx, collision=None):
+        """Put Mario at course idx's start, standing still, with the camera reset behind him. Returns the course name.
+        collision: the course's CourseCollision (None: flat ground at the LEVELS ground height)."""
+        name, _, sx, sy, sz, ground_y = LEVELS[idx]
+        mario.x, mario.y, mario.z = sx, sy, sz
+        mario.ground_y = ground_y
+        mario.floors, mario.walls = (collision.floors, collision.walls) if collision is not None else (None, None)
+        mario.vel_fwd = 0
+        mario.vel_y = 0
+        cam.x, cam.y, cam.z = mario.x, mario.y + 200, mario.z + 300
+        cam.yaw = 0
+        cam.pitch = math.radians(15)
+        cam.target_yaw = 0
+        cam.target_pitch = math.radians(15)
+        return name
+
+    # ---------------- HEADLESS SIMULATION ----------------
+    class KeyState:
+        """Synthetic pygame.key.get_pressed() result: indexable by key code, true for the held keys."""
+        __slots__ = ("held",)
+
+        def __init__(self, held=()):
+            self.held = frozenset(held)
+
+        def __getitem__(self, key):
+            return key in self.held
+
+    NO_KEYS = KeyState()
+
+    # Button bitmask layout shared by batch physics and input recordings
+    BUTTON_LEFT, BUTTON_RIGHT, BUTTON_UP, BUTTON_DOWN, BUTTON_JUMP = 1, 2, 4, 8, 16
+    BUTTON_KEYS = ((BUTTON_LEFT, pygame.K_LEFT), (BUTTON_RIGHT, pygame.K_RIGHT), (BUTTON_UP, pygame.K_UP),
+                   (BUTTON_DOWN, pygame.K_DOWN), (BUTTON_JUMP, pygame.K_SPACE))
+
+    def keys_to_buttons(keys):
+        """Pack the keys Mario.update reads into a button bitmask."""
+        return sum(bit for bit, key in BUTTON_KEYS if keys[key])
+
+    def buttons_to_keys(buttons):
+        """KeyState holding exactly the keys in a button bitmask."""
+        return KeyState(key for bit, key in BUTTON_KEYS if buttons & bit)
+
+    def simulate(level_idx, inputs=(), steps=None, on_step=None, before_step=None, collision=None):
+        """Step Mario and the camera on course level_idx with no window, as fast as the CPU allows.
+
+        inputs: per-step key states - a sequence of KeyState/iterables of key codes, or a
+            callable step -> either. Steps past the end of a sequence get no keys held.
+        steps: number of physics steps (default len(inputs)).
+        on_step: optional callback(step, mario, cam) after every step, for bots and traces.
+        before_step: optional callback(step, mario, cam) before every step (e.g. camera controls).
+        collision: the course's CourseCollision if already built (default level_collision(level_idx)).
+        Returns the final (mario, cam). No display, font or clock is touched, so pygame
+        need not be initialized.
+        """
+        global cam
+        if steps is None:
+            steps = len(inputs)
+        sim_mario, sim_cam = Mario(), Camera()
+        spawn(sim_mario, sim_cam, level_idx, collision if collision is not None else level_collision(level_idx))
+        saved_cam = globals().get("cam")
+        cam = sim_cam # Mario.update steers relative to the global camera
+        try:
+            for step in range(steps):
+                if callable(inputs):
+                    keys = inputs(step)
+                else:
+                    keys = inputs[step] if step < len(inputs) else NO_KEYS
+                if not isinstance(keys, KeyState):
+                    keys = KeyState(keys)
+                if before_step is not None:
+                    before_step(step, sim_mario, sim_cam)
+                sim_mario.update(keys)
+                sim_cam.update(sim_mario.x, sim_mario.y, sim_mario.z)
+                if on_step is not None:
+                    on_step(step, sim_mario, sim_cam)
+        finally:
+            cam = saved_cam
+        return sim_mario, sim_cam
+
+    # ---------------- INPUT RECORDING ----------------
+    CAMERA_EVENT_KEYS = (pygame.K_q, pygame.K_e, pygame.K_r, pygame.K_f) # Camera event code = index
+
+    def camera_event(cam, code):
+        """Apply a Q/E/R/F camera control (code indexes CAMERA_EVENT_KEYS)."""
+        if code == 0:
+            cam.target_yaw -= math.pi / 2
+        elif code == 1:
+            cam.target_yaw += math.pi / 2
+        elif code == 2:
+            cam.target_pitch = max(PITCH_MIN, cam.target_pitch + math.radians(12))
+        elif code == 3:
+            cam.target_pitch = min(PITCH_MAX, cam.target_pitch - math.radians(12))
+
+    class InputRecording:
+        """One course session as per-physics-step button bitmasks plus camera events.
+
+        Binary form: MAGIC, course index (u8), step count (u32), then records. A record byte
+        holds the buttons in its low 5 bits; bit 5 means a count byte and that many camera
+        event codes follow (applied before the record's first step); bit 6 means a byte
+        follows giving the record's length in steps minus 2, so one record covers up to 257
+        steps of unchanged buttons.
+        """
+        MAGIC = b"SM64IN\x01"
+        HAS_EVENTS, HAS_REPEAT = 0x20, 0x40
+
+        def __init__(self, level_idx):
+            self.level_idx = level_idx
+            self.buttons = bytearray()
+            self.events = {}  # step -> bytes of camera event codes applied before it
+            self.pending = bytearray()
+
+        def __len__(self):
+            return len(self.buttons)
+
+        def __getitem__(self, step):
+            """(buttons, camera event codes) for one step."""
+            return self.buttons[step], self.events.get(step, b"")
+
+        def camera_event(self, code):
+            """Note a camera event; it is applied before the next recorded step."""
+            self.pending.append(code)
+
+        def step(self, buttons):
+            """Record the buttons held for one physics step."""
+            if self.pending:
+                self.events[len(self.buttons)] = bytes(self.pending)
+                self.pending.clear()
+            self.buttons.append(buttons)
+
+        def to_bytes(self):
+            out = bytearray(self.MAGIC + struct.pack("<BI", self.level_idx, len(self.buttons)))
+            step = 0
+            while step < len(self.buttons):
+                buttons = self.buttons[step]
+                events = self.events.get(step, b"")
+                run = 1
+                while (run < 257 and step + run < len(self.buttons) and self.buttons[step + run] == buttons
+                       and step + run not in self.events):
+                    run += 1
+                out.append(buttons | (self.HAS_EVENTS if events else 0) | (self.HAS_REPEAT if run > 1 else 0))
+                if events:
+                    out.append(len(events))
+                    out += events
+                if run > 1:
+                    out.append(run - 2)
+                step += run
+            return bytes(out)
+
+        @classmethod
+        def from_bytes(cls, data):
+            if data[:len(cls.MAGIC)] != cls.MAGIC:
+                raise ValueError("not an input recording")
+            pos = len(cls.MAGIC)
+            level_idx, steps = struct.unpack_from("<BI", data, pos)
+            pos += struct.calcsize("<BI")
+            rec = cls(level_idx)
+            while len(rec.buttons) < steps:
+                flags = data[pos]
+                pos += 1
+                if flags & cls.HAS_EVENTS:
+                    n = data[pos]
+                    rec.events[len(rec.buttons)] = bytes(data[pos + 1:pos + 1 + n])
+                    pos += 1 + n
+                run = 1
+                if flags & cls.HAS_REPEAT:
+                    run = data[pos] + 2
+                    pos += 1
+                rec.buttons += bytes([flags & 0x1F]) * run
+            return rec
+
+        def save(self, path):
+            with open(path, "wb") as f:
+                f.write(self.to_bytes())
+
+        @classmethod
+        def load(cls, path):
+            with open(path, "rb") as f:
+                return cls.from_bytes(f.read())
+
+    def replay_inputs(recording, on_step=None):
+        """Headless replay of a recording through simulate(); returns the final (mario, cam)."""
+        def before_step(step, mario, cam):
+            for code in recording.events.get(step, b""):
+                camera_event(cam, code)
+        return simulate(recording.level_idx, lambda step: buttons_to_keys(recording.buttons[step]),
+                        len(recording), on_step, before_step)
+
+    # ---------------- BATCH PHYSICS ----------------
+    MARIO_STATES = ("IDLE", "RUN", "JUMP") # MarioBatch.state holds indices into this
+
+    class MarioBatch:
+        """Many Marios stepped together: Mario.update semantics on NumPy float64 arrays.
+
+        Operations mirror the scalar code term for term so every agent stays bit-identical
+        to a Mario fed the same buttons (see check_batch_physics). All agents share one
+        course's floors and walls; those are queried per agent with the scalar code.
+        """
+        # atan2(dx, dz) for each stick direction, indexed (dx + 1) * 3 + (dz + 1)
+        INPUT_ANGLES = [math.atan2(dx, dz) for dx in (-1, 0, 1) for dz in (-1, 0, 1)]
+
+        def __init__(self, n):
+            if np is None:
+                raise ImportError("MarioBatch needs NumPy")
+            self.x = np.zeros(n)
+            self.y = np.zeros(n)
+            self.z = np.zeros(n)
+            self.vel_fwd = np.zeros(n)
+            self.vel_y = np.zeros(n)
+            self.face_angle = np.zeros(n)
+            self.ground_y = np.zeros(n)
+            self.state = np.zeros(n, dtype=np.int8)
+            self.input_angles = np.array(self.INPUT_ANGLES)
+            self.floors = None # FloorGrid shared by every agent, as on Mario
+            self.walls = None  # LevelBVH shared by every agent
+
+        def __len__(self):
+            return len(self.x)
+
+        @classmethod
+        def from_marios(cls, marios):
+            batch = cls(len(marios))
+            if marios:
+                batch.floors, batch.walls = marios[0].floors, marios[0].walls
+            for i, m in enumerate(marios):
+                batch.set(i, m)
+            return batch
+
+        def set(self, i, mario):
+            """Copy a scalar Mario into slot i (it must be on this batch's course)."""
+            if mario.floors is not self.floors or mario.walls is not self.walls:
+                raise ValueError("Mario's floors/walls differ from the batch's course")
+            for a in ("x", "y", "z", "vel_fwd", "vel_y", "face_angle", "ground_y"):
+                getattr(self, a)[i] = getattr(mario, a)
+            self.state[i] = MARIO_STATES.index(mario.state)
+
+        def get(self, i):
+            """Scalar Mario with slot i's state."""
+            mario = Mario()
+            for a in ("x", "y", "z", "vel_fwd", "vel_y", "face_angle", "ground_y"):
+                setattr(mario, a, float(getattr(self, a)[i]))
+            mario.state = MARIO_STATES[self.state[i]]
+            mario.floors, mario.walls = self.floors, self.walls
+            return mario
+
+        def update(self, buttons, cam_yaw):
+            """One Mario.update for every agent. buttons: bitmask per agent; cam_yaw: scalar or per agent."""
+            buttons = np.asarray(buttons)
+            dx = np.where(buttons & BUTTON_RIGHT, 1, np.where(buttons & BUTTON_LEFT, -1, 0))
+            dz = np.where(buttons & BUTTON_DOWN, -1, np.where(buttons & BUTTON_UP, 1, 0))
+            moving = (dx != 0) | (dz != 0)
+
+            # Turn towards input and accelerate, or apply friction
+            target_angle = cam_yaw + self.input_angles[(dx + 1) * 3 + (dz + 1)]
+            angle_diff = np.remainder(target_angle - self.face_angle + math.pi, 2 * math.pi) - math.pi
+            self.face_angle = np.where(moving, self.face_angle + angle_diff * TURN_SPEED, self.face_angle)
+            slowed = self.vel_fwd * FRICTION
+            slowed = np.where(np.abs(slowed) < 0.1, 0.0, slowed)
+            self.vel_fwd = np.where(moving, np.where(self.vel_fwd < MAX_SPEED, self.vel_fwd + ACCEL, self.vel_fwd), slowed)
+
+            # Apply velocity
+            self.x += np.sin(self.face_angle) * self.vel_fwd
+            self.z += np.cos(self.face_angle) * self.vel_fwd
+
+            # Walls and floors: the scalar queries, one agent at a time
+            if self.walls is not None:
+                for i in range(len(self)):
+                    self.x[i], self.z[i] = self.walls.push_out(float(self.x[i]), float(self.y[i]), float(self.z[i]))
+            if self.floors is not None:
+                for i in range(len(self)):
+                    self.ground_y[i] = self.floors.floor_y(float(self.x[i]), float(self.y[i]), float(self.z[i]))
+
+            # Jumping & Gravity
+            jump = ((buttons & BUTTON_JUMP) != 0) & (self.y == self.ground_y)
+            self.vel_y = np.where(jump, -JUMP_FORCE, self.vel_y)
+            self.state = np.where(jump, MARIO_STATES.index("JUMP"), self.state).astype(np.int8)
+            self.vel_y += GRAVITY
+            self.y += self.vel_y
+
+            # Ground Collision
+            landed = self.y > self.ground_y
+            self.y = np.where(landed, self.ground_y, self.y)
+            self.vel_y = np.where(landed, 0.0, self.vel_y)
+            self.state = np.where(landed, np.where(self.vel_fwd > 1, MARIO_STATES.index("RUN"), MARIO_STATES.index("IDLE")),
+                                  self.state).astype(np.int8)
+
+    def check_batch_physics(n=64, steps=600, seed=0, level=None):
+        """Step a MarioBatch and n scalar Marios on the same random buttons; raise AssertionError on any difference.
+        level: LEVELS index whose floors and walls they collide with (None: flat ground only)."""
+        global cam
+        rng = np.random.default_rng(seed)
+        collision = level_collision(level) if level is not None else None
+        marios = []
+        for _ in range(n):
+            m = Mario()
+            m.x, m.z, m.face_angle = (float(v) for v in rng.uniform(-1000, 1000, 3))
+            if collision is not None:
+                m.floors, m.walls = collision.floors, collision.walls
+                m.y = m.ground_y = m.floors.floor_y(m.x, -math.inf, m.z) # On top of whatever is there
+            else:
+                m.y = m.ground_y = float(rng.integers(0, 100))
+            marios.append(m)
+        batch = MarioBatch.from_marios(marios)
+        saved_cam = globals().get("cam")
+        cam = Camera()
+        try:
+            for step in range(steps):
+                buttons = rng.integers(0, 32, n)
+                cam.yaw = float(rng.uniform(-math.pi, math.pi))
+                batch.update(buttons, cam.yaw)
+                for i, m in enumerate(marios):
+                    m.update(buttons_to_keys(int(buttons[i])))
+                    got = batch.get(i)
+                    for a in ("x", "y", "z", "vel_fwd", "vel_y", "face_angle", "ground_y", "state"):
+                        if getattr(got, a) != getattr(m, a):
+                            raise AssertionError(f"step {step} agent {i}: {a} {getattr(got, a)!r} != {getattr(m, a)!r}")
+        finally:
+            cam = saved_cam
+        return True
+
+    # ---------------- TEXT CACHE ----------------
+    TEXT_CACHE_SIZE = 256  # Rendered strings kept before least-recently-used eviction
+    _text_cache = OrderedDict()
+
+    def render_text(font, text, color, antialias=True):
+        """font.render() through a bounded LRU keyed by (font, text, color, antialias)."""
+        key = (font, text, tuple(color), antialias)
+        surf = _text_cache.get(key)
+        if surf is not None:
+            _text_cache.move_to_end(key)
+            return surf
+        surf = font.render(text, antialias, color)
+        _text_cache[key] = surf
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+        return surf
+
+    def render_outlined_text(font, text, fill, outline, thickness=3, shadow=None, shadow_offset=(-2, -2)):
+        """Composite outline (+ optional offset shadow) + fill into one surface, cached like render_text.
+        The text's own top-left sits at (pad, pad), pad = (result width - text width) // 2."""
+        key = (font, text, tuple(fill), tuple(outline), thickness, shadow and tuple(shadow), shadow_offset)
+        surf = _text_cache.get(key)
+        if surf is not None:
+            _text_cache.move_to_end(key)
+            return surf
+        base = render_text(font, text, fill)
+        pad = max([thickness, *(map(abs, shadow_offset) if shadow else ())])
+        surf = pygame.Surface((base.get_width() + 2 * pad, base.get_height() + 2 * pad), pygame.SRCALPHA)
+        edge = render_text(font, text, outline)
+        for dx in range(-thickness, thickness + 1):
+            for dy in range(-thickness, thickness + 1):
+                if dx or dy:
+                    surf.blit(edge, (pad + dx, pad + dy))
+        if shadow:
+            surf.blit(render_text(font, text, shadow), (pad + shadow_offset[0], pad + shadow_offset[1]))
+        surf.blit(base, (pad, pad))
+        _text_cache[key] = surf
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+        return surf
+
     # ---------------- SM64-STYLE MAIN MENU ----------------
-    def draw_main_menu():
-        """SM64-style main menu: blue sky gradient, title, star, press start, copyright."""
-        # Blue sky gradient (SM64: light top, darker bottom)
-        for y in range(HEIGHT):
-            t = y / HEIGHT
-            r = int(SKY_TOP[0] * (1 - t) + SKY_BOTTOM[0] * t)
-            g = int(SKY_TOP[1] * (1 - t) + SKY_BOTTOM[1] * t)
-            b = int(SKY_TOP[2] * (1 - t) + SKY_BOTTOM[2] * t)
-            pygame.draw.line(screen, (r, g, b), (0, y), (WIDTH, y))
+    _gradient_cache = {}  # (size, top, bottom) -> Surface
+
+    def gradient_surface(size, top, bottom):
+        """Vertical top->bottom gradient, built once per (size, colors) and blitted every frame.
+        Entries for other sizes are dropped when the resolution changes."""
+        key = (tuple(size), tuple(top), tuple(bottom))
+        surf = _gradient_cache.get(key)
+        if surf is not None:
+            return surf
+        if any(k[0] != key[0] for k in _gradient_cache):
+            _gradient_cache.clear()
+        w, h = key[0]
+        # One 1px-wide column, then stretched across (nearest-neighbour keeps rows exact)
+        if np is not None:
+            t = (np.arange(h) / h)[:, None]
+            column = (np.array(top[:3]) * (1 - t) + np.array(bottom[:3]) * t).astype(np.uint8)
+            strip = pygame.surfarray.make_surface(column[None, :, :])
+        else:
+            strip = pygame.Surface((1, h))
+            for y in range(h):
+                t = y / h
+                strip.set_at((0, y), tuple(int(top[i] * (1 - t) + bottom[i] * t) for i in range(3)))
+        surf = pygame.transform.scale(strip, (w, h)).convert()
+        _gradient_cache[key] = surf
+        return surf
+
+    def draw_main_menu(shown=None):
+        """SM64-style main menu: blue sky gradient, title, star, press start, copyright.
+        shown: blink phase already on screen, or None to repaint everything.
+        Returns (blink, dirty); dirty is None after a full repaint, else the rects that changed."""
+        blink = (pygame.time.get_ticks() // 500) % 2
+        start_text = render_text(font_menu, "Press SPACE to Start", (255, 255, 255))
+        start_rect = start_text.get_rect(midtop=(WIDTH // 2, HEIGHT // 2 + 40))
+        background = gradient_surface(screen.get_size(), SKY_TOP, SKY_BOTTOM)
+        if shown is not None:
+            # Only the blinking prompt can change between full repaints
+            if blink == shown: return blink, []
+            screen.blit(background, start_rect, start_rect)
+            if blink:
+                screen.blit(start_text, start_rect)
+            return blink, [start_rect]
+
+        # Blue sky gradient (SM64: light top, darker bottom), cached
+        screen.blit(background, (0, 0))
 
         # Gold star (SM64 logo star above title)
         star_cx, star_cy = WIDTH // 2, HEIGHT // 2 - 100
@@ -420,92 +1903,875 @@
         pygame.draw.polygon(screen, TITLE_GOLD, star_points)
         pygame.draw.polygon(screen, (200, 180, 0), star_points, 2)
 
-        # Title: "Ultra Mario 3D Bros" — SM64 style (red outline, gold fill)
+        # Title: "Ultra Mario 3D Bros" — SM64 style (red outline, gold fill), one cached composite
         title_text = "Ultra Mario 3D Bros"
-        # Outline (multiple offsets for thick outline)
-        for dx in [-3, -2, -1, 0, 1, 2, 3]:
-            for dy in [-3, -2, -1, 0, 1, 2, 3]:
-                if dx == 0 and dy == 0:
-                    continue
-                surf = font_title.render(title_text, True, TITLE_OUTLINE)
-                screen.blit(surf, (WIDTH // 2 - surf.get_width() // 2 + dx, HEIGHT // 2 - 40 + dy))
-        surf = font_title.render(title_text, True, TITLE_RED)
-        screen.blit(surf, (WIDTH // 2 - surf.get_width() // 2 - 2, HEIGHT // 2 - 42))
-        surf = font_title.render(title_text, True, TITLE_GOLD)
-        screen.blit(surf, (WIDTH // 2 - surf.get_width() // 2, HEIGHT // 2 - 40))
+        w = render_text(font_title, title_text, TITLE_GOLD).get_width()
+        surf = render_outlined_text(font_title, title_text, TITLE_GOLD, TITLE_OUTLINE, 3, TITLE_RED)
+        pad = (surf.get_width() - w) // 2
+        screen.blit(surf, (WIDTH // 2 - w // 2 - pad, HEIGHT // 2 - 40 - pad))
 
         # "Press SPACE to Start" (blinking like SM64)
-        blink = (pygame.time.get_ticks() // 500) % 2
         if blink:
-            start_text = font_menu.render("Press SPACE to Start", True, (255, 255, 255))
-            screen.blit(start_text, (WIDTH // 2 - start_text.get_width() // 2, HEIGHT // 2 + 40))
+            screen.blit(start_text, start_rect)
 
         # Copyright line (SM64-style at bottom)
-        copy_text = font.render("(C) Cat's 1999-2026  (C) Nintendo", True, (200, 200, 255))
+        copy_text = render_text(font, "(C) Cat's 1999-2026  (C) Nintendo", (200, 200, 255))
         screen.blit(copy_text, (WIDTH // 2 - copy_text.get_width() // 2, HEIGHT - 50))
+        return blink, None
+
+    def course_row_rect(i):
+        return pygame.Rect(80, 90 + i * 32 - 4, WIDTH - 160, 28)
+
+    def draw_course_row(i, sel):
+        r = course_row_rect(i)
+        color = (120, 200, 100) if i == sel else GRASS_GREEN
+        pygame.draw.rect(screen, color, r, border_radius=6)
+        pygame.draw.rect(screen, BLACK, r, 2, border_radius=6)
+        txt = render_text(font, f"{i+1}. {LEVELS[i][0]}", WHITE)
+        screen.blit(txt, (100, r.y + 4))
+
+    def draw_course_select(sel, shown=None):
+        """Course list with sel highlighted. shown: selection already on screen, or None to repaint everything.
+        Returns None after a full repaint, else the rects that changed."""
+        hint = render_text(font, "1-9/0: Select  ENTER: Play  ESC: Back", (200, 200, 255))
+        hint_pos = (WIDTH // 2 - hint.get_width() // 2, HEIGHT - 36)
+        if shown is not None:
+            if shown == sel: return []
+            dirty = [course_row_rect(shown), course_row_rect(sel)]
+            for i, r in zip((shown, sel), dirty):
+                screen.fill(SKY_BOTTOM, r) # Rounded corners show the background
+                draw_course_row(i, sel)
+                # The last rows run under the hint; put it back on top, clipped to what was repainted
+                screen.set_clip(r)
+                screen.blit(hint, hint_pos)
+                screen.set_clip(None)
+            return dirty
 
-    def draw_course_select(sel):
         screen.fill(SKY_BOTTOM)
-        t = font_title.render("Select Course", True, TITLE_GOLD)
+        t = render_text(font_title, "Select Course", TITLE_GOLD)
         screen.blit(t, (WIDTH // 2 - t.get_width() // 2, 30))
-        for i, (name, _, _, _, _, _) in enumerate(LEVELS):
-            y = 90 + i * 32
-            r = pygame.Rect(80, y - 4, WIDTH - 160, 28)
-            color = (120, 200, 100) if i == sel else GRASS_GREEN
-            pygame.draw.rect(screen, color, r, border_radius=6)
-            pygame.draw.rect(screen, BLACK, r, 2, border_radius=6)
-            txt = font.render(f"{i+1}. {name}", True, WHITE)
-            screen.blit(txt, (100, y))
-        hint = font.render("1-9/0: Select  ENTER: Play  ESC: Back", True, (200, 200, 255))
-        screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, HEIGHT - 36))
+        for i in range(len(LEVELS)):
+            draw_course_row(i, sel)
+        screen.blit(hint, hint_pos)
 
     def get_course_click(pos):
         for i in range(len(LEVELS)):
-            y = 90 + i * 32
-            r = pygame.Rect(80, y - 4, WIDTH - 160, 28)
-            if r.collidepoint(pos):
+            if course_row_rect(i).collidepoint(pos):
                 return i
         return None
 
-    # ---------------- MAIN LOOP (run entry point) ----------------
-    def run():
-        """Run Ultra Mario 3D Bros. No external files; all rendering in-code."""
-        global screen, clock, font, font_title, font_menu, game_state
-        global mario, cam, world_polys
+    def present(dirty):
+        """Flip after a full repaint; otherwise push only the dirty rects (nothing at all when idle)."""
+        if dirty is None:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
+
+    # ---------------- STARTUP ----------------
+    FONT_INDEX_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                                   "pysm64", "fonts.json")
+    _font_index = None
+    startup_marks = [] # (label, perf_counter) from STARTUP_T0 to the first presented frame
+
+    def startup_mark(label):
+        if startup_marks is not None:
+            startup_marks.append((label, time.perf_counter()))
+
+    def report_startup():
+        """Print the import -> first frame breakdown once, after the first present."""
+        global startup_marks
+        if startup_marks is None: return
+        startup_mark("first frame")
+        prev, parts = STARTUP_T0, []
+        for label, t in startup_marks:
+            parts.append(f"{label} {(t - prev) * 1000:.0f}")
+            prev = t
+        print(f"startup: {(prev - STARTUP_T0) * 1000:.0f} ms from import to first frame ({', '.join(parts)} ms)")
+        startup_marks = None
+
+    def cached_sysfont(name, size, bold=False):
+        """pygame.font.SysFont without the system font scan: the file SysFont resolves for
+        (name, bold) is remembered in a small JSON index at FONT_INDEX_PATH."""
+        global _font_index
+        if _font_index is None:
+            try:
+                with open(FONT_INDEX_PATH) as f:
+                    _font_index = json.load(f)
+            except (OSError, ValueError):
+                _font_index = {}
+        key = f"{name}|{int(bold)}"
+        entry = _font_index.get(key)
+        if entry is None or (entry[0] is not None and not os.path.exists(entry[0])):
+            # Let SysFont do the (slow) lookup once and keep what it would have opened
+            found = []
+            pygame.font.SysFont(name, size, bold, constructor=lambda path, size, b, i: found.append([path, b]))
+            entry = _font_index[key] = found[0]
+            try:
+                os.makedirs(os.path.dirname(FONT_INDEX_PATH), exist_ok=True)
+                with open(FONT_INDEX_PATH, "w") as f:
+                    json.dump(_font_index, f)
+            except OSError:
+                pass # Read-only home: just resolve again next launch
+        path, emulate_bold = entry
+        font = pygame.font.Font(path, size)
+        if emulate_bold:
+            font.set_bold(True)
+        return font
+
+    # ---------------- FRAME DRAWING ----------------
+    def init_display():
+        """pygame, the window, clock and fonts (shared by run() and benchmark())."""
+        global screen, clock, font, font_title, font_menu
         pygame.init()
         screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED | pygame.RESIZABLE)
         pygame.display.set_caption("Ultra Mario 3D Bros - pysm64")
         clock = pygame.time.Clock()
-        font = pygame.font.SysFont("Arial", 18, bold=True)
-        font_title = pygame.font.SysFont("Arial", 48, bold=True)
-        font_menu = pygame.font.SysFont("Arial", 24, bold=True)
+        startup_mark("display")
+        font = cached_sysfont("Arial", 18, bold=True)
+        font_title = cached_sysfont("Arial", 48, bold=True)
+        font_menu = cached_sysfont("Arial", 24, bold=True)
+        startup_mark("fonts")
+
+    def build_course(idx, mode7=True, transform=None):
+        """(Mode 7 floor or None, BSP, CourseCollision) for LEVELS[idx] from one builder call;
+        static, so built once per course.
+        transform: optional LevelMesh -> LevelMesh applied before the BSP build (benchmark scaling)."""
+        mesh, floor = LEVELS[idx][1](), None
+        solid = split_base(mesh)[1]
+        if mode7 and np is not None:
+            floor, mesh = extract_floor(mesh)
+        if transform is not None:
+            mesh, solid = transform(mesh), transform(solid)
+        return floor, BSPTree(mesh), CourseCollision(solid, LEVELS[idx][5])
+
+    # ---------------- COURSE CACHE ----------------
+    COURSE_CACHE_BYTES = 32 * 1024 * 1024 # Estimated memory kept in built courses before LRU eviction
+    PY_VERTEX_BYTES = 160  # Rough footprint of one (x, y, z) tuple in a LevelMesh packed without NumPy
+    BSP_NODE_BYTES = 200   # Rough footprint of one BSPNode (one node per polygon at most)
+    COLLISION_POLY_BYTES = 600 # Rough footprint of one polygon in a FloorGrid plus LevelBVH
+
+    def course_nbytes(course):
+        """Estimated memory held by a built (floor, bsp, collision) course."""
+        floor, bsp, collision = course
+        mesh = bsp.mesh
+        total = len(mesh) * BSP_NODE_BYTES
+        if isinstance(mesh._points, list):
+            total += len(mesh._points) * PY_VERTEX_BYTES
+        for a in (mesh.verts, mesh.starts, mesh.counts, mesh.colors, mesh.centroids, mesh.normals, mesh.centers, mesh.radii,
+                  mesh.lod_index, mesh.lod_level):
+            total += getattr(a, "nbytes", 0)
+        if floor is not None:
+            total += floor.texture.nbytes + floor.color.nbytes
+        if collision is not None:
+            total += collision.mesh.verts.nbytes + len(collision.mesh) * COLLISION_POLY_BYTES
+        return total
+
+    class CourseCache:
+        """Built courses (Mode 7 floor, BSP, collision) by LEVELS index: an LRU capped at max_bytes, plus
+        a daemon thread that builds a prefetched course (the highlighted one) ahead of get()."""
+        def __init__(self, build, max_bytes=COURSE_CACHE_BYTES):
+            self.build = build # idx -> (floor, bsp, collision)
+            self.max_bytes = max_bytes
+            self.items = OrderedDict() # idx -> (course, nbytes)
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.cond = threading.Condition()
+            self.building = None # Index the thread is building
+            self.wanted = None   # Next index for the thread (latest prefetch wins)
+            self.thread = None
+
+        def _store(self, idx, course):
+            if idx in self.items:
+                self.bytes -= self.items.pop(idx)[1]
+            nbytes = course_nbytes(course)
+            self.items[idx] = (course, nbytes)
+            self.bytes += nbytes
+            while len(self.items) > 1 and self.bytes > self.max_bytes:
+                self.bytes -= self.items.popitem(last=False)[1][1]
+
+        def prefetch(self, idx):
+            """Queue idx for a background build unless it is cached or already underway."""
+            with self.cond:
+                if idx in self.items or idx == self.building or idx == self.wanted:
+                    return
+                self.wanted = idx
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._worker, name="course-prebuild", daemon=True)
+                    self.thread.start()
+                self.cond.notify_all()
+
+        def _worker(self):
+            while True:
+                with self.cond:
+                    while self.wanted is None:
+                        self.cond.wait()
+                    idx, self.wanted = self.wanted, None
+                    if idx in self.items:
+                        continue
+                    self.building = idx
+                try:
+                    course = self.build(idx)
+                except Exception:
+                    course = None # get() builds it again and raises on the main thread
+                with self.cond:
+                    self.building = None
+                    if course is not None:
+                        self._store(idx, course)
+                    self.cond.notify_all()
+
+        def get(self, idx):
+            """Built course idx: cached, finished by the prebuild thread, or built now."""
+            with self.cond:
+                while idx == self.building:
+                    self.cond.wait() # Nearly done in the background; don't build it twice
+                if idx in self.items:
+                    self.hits += 1
+                    self.items.move_to_end(idx)
+                    return self.items[idx][0]
+                self.misses += 1
+                if self.wanted == idx:
+                    self.wanted = None # Building it here; the thread need not
+            course = self.build(idx)
+            with self.cond:
+                self._store(idx, course)
+            return course
+
+    # ---------------- LEVEL FILES ----------------
+    # Little-endian: header, then 8-byte aligned sections in this order:
+    #   verts f4 (V, 3) | starts u4 (P) | counts u4 (P) | color index u2 (P) | palette u1 (C, 4)
+    #   | node planes f8 (N, 4) | node links i4 (N, 5) | poly LOD i4 (P, 2) | LOD objects f8 (K, 4 + S)
+    #   | collision verts f8 (CV, 3) | collision counts u4 (CP)
+    # The mesh is the render-ready BSP fragment mesh, so loading skips the builder and the BSP build.
+    # Poly LOD rows are (object, level) with object -1 for plain polygons; LOD object rows are
+    # (center x, y, z, radius, sizes...) with unused sizes 0. The collision polygons are the
+    # CourseCollision source in full precision, so loaded courses collide exactly like built ones.
+    LEVEL_MAGIC = b"SM64LVL3"
+    # magic, V, P, C, N, K, S, CV, CP, flags, floor y, ground y, floor RGBA
+    LEVEL_HEADER = struct.Struct("<8sIIIIIIIIBxxxdd4B")
+    LEVEL_MODE7, LEVEL_HAS_FLOOR, LEVEL_HAS_COLLISION = 1, 2, 4 # Header flag bits
+
+    def _level_sections(n_verts, n_polys, n_palette, n_nodes, n_lods=0, n_sizes=0, n_solid_verts=0, n_solid=0):
+        """(dtype, shape, byte offset) of each section after the header."""
+        sections, offset = [], LEVEL_HEADER.size
+        for dtype, shape in (("<f4", (n_verts, 3)), ("<u4", (n_polys,)), ("<u4", (n_polys,)), ("<u2", (n_polys,)),
+                             ("u1", (n_palette, 4)), ("<f8", (n_nodes, 4)), ("<i4", (n_nodes, 5)),
+                             ("<i4", (n_polys, 2)), ("<f8", (n_lods, 4 + n_sizes)),
+                             ("<f8", (n_solid_verts, 3)), ("<u4", (n_solid,))):
+            offset = (offset + 7) // 8 * 8
+            sections.append((dtype, shape, offset))
+            offset += np.dtype(dtype).itemsize * math.prod(shape)
+        return sections, offset
+
+    def export_course(idx, path, mode7=True):
+        """Build LEVELS[idx] (Mode 7 floor split off when mode7) and write it as a level file."""
+        write_course(build_course(idx, mode7), path, mode7)
+
+    def write_course(course, path, mode7=True):
+        """Write a built (floor, bsp, collision) course as a level file (collision may be None)."""
+        floor, bsp, collision = course
+        mesh = bsp.mesh
+        palette, color_idx = np.unique(mesh.colors, axis=0, return_inverse=True)
+        if len(palette) > 0xFFFF:
+            raise ValueError("level has more than 65535 distinct colors")
+        # Flatten the tree in pre-order; node polys are already contiguous mesh ranges
+        nodes, stack = [], [bsp.root] if bsp.root is not None else []
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack += [n for n in (node.back, node.front) if n is not None]
+        ids = {id(node): i for i, node in enumerate(nodes)}
+        planes = np.zeros((len(nodes), 4))
+        links = np.zeros((len(nodes), 5), dtype=np.int32)
+        for i, node in enumerate(nodes):
+            if node.plane is not None:
+                (nx, ny, nz), d = node.plane
+                planes[i] = nx, ny, nz, d
+            links[i] = (ids[id(node.front)] if node.front is not None else -1,
+                        ids[id(node.back)] if node.back is not None else -1,
+                        node.polys[0] if node.polys else 0, len(node.polys), node.plane is None)
+
+        poly_lods = np.stack([mesh.lod_index, mesh.lod_level], axis=1) if len(mesh) else np.zeros((0, 2))
+        n_sizes = mesh.lod_sizes.shape[1]
+        lod_objects = np.concatenate([mesh.lod_centers, mesh.lod_radii[:, None], mesh.lod_sizes], axis=1)
+
+        solid = collision.mesh if collision is not None else LevelMesh().pack()
+
+        flags = ((LEVEL_MODE7 if mode7 else 0) | (LEVEL_HAS_FLOOR if floor is not None else 0)
+                 | (LEVEL_HAS_COLLISION if collision is not None else 0))
+        floor_color = floor.base_color + (255,) if floor is not None else (0, 0, 0, 0)
+        header = LEVEL_HEADER.pack(LEVEL_MAGIC, len(mesh.verts), len(mesh), len(palette), len(nodes),
+                                   len(mesh.lod_objects), n_sizes, len(solid.verts), len(solid), flags,
+                                   floor.y if floor is not None else 0.0,
+                                   collision.ground_y if collision is not None else 0.0, *floor_color)
+        sections, size = _level_sections(len(mesh.verts), len(mesh), len(palette), len(nodes), len(mesh.lod_objects), n_sizes,
+                                          len(solid.verts), len(solid))
+        data = bytearray(size)
+        data[:len(header)] = header
+        for (dtype, shape, offset), array in zip(sections, (mesh.verts, mesh.starts, mesh.counts, color_idx.reshape(-1),
+                                                            palette, planes, links, poly_lods, lod_objects,
+                                                            solid.verts, solid.counts)):
+            raw = np.ascontiguousarray(array, dtype=dtype).tobytes()
+            data[offset:offset + len(raw)] = raw
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def course_path(course_dir, idx):
+        return os.path.join(course_dir, f"course_{idx:02d}.sm64lvl")
+
+    def level_file_mode7(path):
+        """Whether a level file was exported with its Mode 7 floor split off (None if unreadable)."""
+        try:
+            with open(path, "rb") as f:
+                fields = LEVEL_HEADER.unpack(f.read(LEVEL_HEADER.size))
+        except (OSError, struct.error):
+            return None
+        magic, flags = fields[0], fields[9]
+        return bool(flags & LEVEL_MODE7) if magic == LEVEL_MAGIC else None
+
+    def load_course(path):
+        """Memory-map a level file into a (floor, bsp, collision) course. Vertices stay views of the
+        read-only mapping (shared page cache, no copy); only per-polygon arrays and the
+        collision structures are derived."""
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, n_verts, n_polys, n_palette, n_nodes, n_lods, n_sizes, n_solid_verts, n_solid, flags, floor_y, ground_y,
+         *floor_color) = LEVEL_HEADER.unpack_from(buf)
+        if magic != LEVEL_MAGIC:
+            raise ValueError(f"{path}: not a level file")
+        sections, size = _level_sections(n_verts, n_polys, n_palette, n_nodes, n_lods, n_sizes, n_solid_verts, n_solid)
+        if len(buf) < size:
+            raise ValueError(f"{path}: truncated level file")
+        verts, starts, counts, color_idx, palette, planes, links, poly_lods, lod_rows, solid_verts, solid_counts = (
+            np.frombuffer(buf, dtype=dtype, count=math.prod(shape), offset=offset).reshape(shape)
+            for dtype, shape, offset in sections)
+        objects = [LodObject(row[:3], row[3], [v for v in row[4:] if v > 0]) for row in lod_rows.tolist()]
+        lods = [(objects[obj], level) if obj >= 0 else None for obj, level in poly_lods.tolist()]
+        # Index arrays are small; widen them so index arithmetic never wraps
+        mesh = LevelMesh.from_arrays(verts, starts.astype(np.int64), counts.astype(np.int64), palette[color_idx], lods)
+        floor = Mode7Floor(floor_y, tuple(floor_color[:3])) if flags & LEVEL_HAS_FLOOR else None
+        collision = None
+        if flags & LEVEL_HAS_COLLISION:
+            solid_counts = solid_counts.astype(np.int64)
+            solid = LevelMesh.from_arrays(solid_verts, np.cumsum(solid_counts) - solid_counts, solid_counts,
+                                          np.zeros((n_solid, 4), dtype=np.uint8))
+            collision = CourseCollision(solid, ground_y)
+        return floor, BSPTree.from_arrays(mesh, planes, links), collision
+
+    # ---------------- CHUNK STREAMING ----------------
+    # A chunked course is a directory: index.json (level format, chunk size, Mode 7 flag, floor, chunk keys)
+    # plus one level file per non-empty x/z chunk, each with its own BSP, and a collision level
+    # file holding the whole course's CourseCollision (collision is never streamed).
+    CHUNK_SIZE = 1000                     # World units per chunk side (x and z)
+    CHUNK_RADIUS = 2                      # Chunks kept resident around Mario and the camera, per side
+    CHUNK_BUDGET_BYTES = 8 * 1024 * 1024  # Estimated memory of resident chunks before far ones are evicted
+    CHUNK_INDEX = "index.json"
+    CHUNK_COLLISION = "collision.sm64lvl"
+
+    def chunk_key(x, z, size=CHUNK_SIZE):
+        return (math.floor(x / size), math.floor(z / size))
+
+    def split_chunks(mesh, size=CHUNK_SIZE):
+        """{(cx, cz): LevelMesh} with each polygon in the chunk holding its bounding-sphere center
+        (its LOD object's center, so all levels of an object share a chunk)."""
+        chunks = {}
+        for poly in mesh:
+            center = poly.lod[0].center if poly.lod is not None else poly.center
+            key = chunk_key(center[0], center[2], size)
+            chunks.setdefault(key, LevelMesh()).append(poly)
+        return chunks
+
+    def chunks_path(course_dir, idx):
+        return os.path.join(course_dir, f"course_{idx:02d}.chunks")
+
+    def chunk_file(chunk_dir, key):
+        return os.path.join(chunk_dir, f"chunk_{key[0]}_{key[1]}.sm64lvl")
+
+    def chunk_index(chunk_dir):
+        """A chunk directory's index (dict), or None if it has none."""
+        try:
+            with open(os.path.join(chunk_dir, CHUNK_INDEX)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    class ChunkedCourse:
+        """A course cut into x/z chunks: its Mode 7 floor (or None), its CourseCollision and a loader
+        per chunk key returning that chunk's BSPTree. No chunk is built or read until it is loaded."""
+        def __init__(self, floor, loaders, size=CHUNK_SIZE, collision=None):
+            self.floor = floor
+            self.loaders = loaders # (cx, cz) -> () -> BSPTree
+            self.size = size
+            self.collision = collision
+
+        @classmethod
+        def from_builder(cls, idx, mode7=True, size=CHUNK_SIZE):
+            """Split LEVELS[idx] in memory; each chunk's BSP is built when it is loaded."""
+            mesh, floor = LEVELS[idx][1](), None
+            collision = CourseCollision(split_base(mesh)[1], LEVELS[idx][5])
+            if mode7 and np is not None:
+                floor, mesh = extract_floor(mesh)
+            return cls(floor, {key: (lambda chunk=chunk: BSPTree(chunk)) for key, chunk in split_chunks(mesh, size).items()},
+                       size, collision)
+
+        @classmethod
+        def load(cls, chunk_dir):
+            """Open a chunk directory (export_chunks); each chunk is memory-mapped when it is loaded."""
+            index = chunk_index(chunk_dir)
+            if index is None:
+                raise ValueError(f"{chunk_dir}: no chunk index")
+            floor = Mode7Floor(index["floor"][0], tuple(index["floor"][1:])) if index["floor"] else None
+            return cls(floor, {tuple(key): (lambda path=chunk_file(chunk_dir, key): load_course(path)[1])
+                               for key in index["chunks"]}, index["size"],
+                       load_course(os.path.join(chunk_dir, CHUNK_COLLISION))[2])
+
+    def export_chunks(idx, chunk_dir, mode7=True):
+        """Write LEVELS[idx] as a chunk directory for ChunkedCourse.load."""
+        course = ChunkedCourse.from_builder(idx, mode7)
+        os.makedirs(chunk_dir, exist_ok=True)
+        for key, build in course.loaders.items():
+            write_course((None, build(), None), chunk_file(chunk_dir, key), mode7)
+        write_course((None, BSPTree(()), course.collision), os.path.join(chunk_dir, CHUNK_COLLISION), mode7)
+        floor = course.floor
+        with open(os.path.join(chunk_dir, CHUNK_INDEX), "w") as f:
+            json.dump({"format": LEVEL_MAGIC.decode(), "size": course.size, "mode7": mode7,
+                       "floor": [floor.y, *floor.base_color] if floor is not None else None,
+                       "chunks": sorted(list(key) for key in course.loaders)}, f)
+
+    class ChunkStreamer:
+        """Keeps the chunks of a ChunkedCourse within radius of Mario and the camera resident.
+        Missing chunks are loaded nearest first by a daemon thread; chunks no longer wanted stay
+        cached until resident memory passes max_bytes, then go least recently wanted first.
+        Wanted chunks are never evicted, so the budget can be exceeded by the area in view."""
+        def __init__(self, course, radius=CHUNK_RADIUS, max_bytes=CHUNK_BUDGET_BYTES):
+            self.course = course
+            self.radius = radius
+            self.max_bytes = max_bytes
+            self.resident = OrderedDict() # (cx, cz) -> (bsp, nbytes), least recently wanted first
+            self.bytes = 0
+            self.wanted = set()
+            self.queue = []     # Keys for the thread, nearest first
+            self.loading = None # Key the thread is loading
+            self.loads = 0
+            self.evictions = 0
+            self.cond = threading.Condition()
+            self.thread = None
+            self.closed = False
+
+        def keys_near(self, points):
+            """Existing chunk keys within radius chunks of any (x, z) point."""
+            keys, r = set(), self.radius
+            for x, z in points:
+                cx, cz = chunk_key(x, z, self.course.size)
+                keys.update(key for key in ((cx + dx, cz + dz) for dx in range(-r, r + 1) for dz in range(-r, r + 1))
+                            if key in self.course.loaders)
+            return keys
+
+        def update(self, points, wait=False):
+            """Want the chunks near the given (x, z) points (Mario, camera). Missing ones are queued
+            for the loader thread, or loaded before returning when wait (course entry)."""
+            wanted = self.keys_near(points)
+            x, z = points[0]
+            size = self.course.size
+            with self.cond:
+                self.wanted = wanted
+                for key in wanted:
+                    if key in self.resident:
+                        self.resident.move_to_end(key)
+                self.queue = sorted((key for key in wanted if key not in self.resident and key != self.loading),
+                                    key=lambda key: ((key[0] + 0.5) * size - x) ** 2 + ((key[1] + 0.5) * size - z) ** 2)
+                if wait:
+                    missing, self.queue = self.queue, []
+                    while self.loading is not None:
+                        self.cond.wait()
+                elif self.queue:
+                    if self.thread is None:
+                        self.thread = threading.Thread(target=self._worker, name="chunk-loader", daemon=True)
+                        self.thread.start()
+                    self.cond.notify_all()
+                self._evict()
+            if wait:
+                for key in missing:
+                    if key not in self.resident:
+                        bsp = self.course.loaders[key]()
+                        with self.cond:
+                            self._store(key, bsp)
+
+        def _store(self, key, bsp):
+            nbytes = course_nbytes((None, bsp, None))
+            self.resident[key] = (bsp, nbytes)
+            self.bytes += nbytes
+            self.loads += 1
+            self._evict()
+
+        def _evict(self):
+            for key in list(self.resident):
+                if self.bytes <= self.max_bytes:
+                    break
+                if key not in self.wanted:
+                    self.bytes -= self.resident.pop(key)[1]
+                    self.evictions += 1
+
+        def _worker(self):
+            while True:
+                with self.cond:
+                    while not self.queue and not self.closed:
+                        self.cond.wait()
+                    if self.closed:
+                        return
+                    key = self.queue.pop(0)
+                    if key in self.resident:
+                        continue
+                    self.loading = key
+                try:
+                    bsp = self.course.loaders[key]()
+                except Exception:
+                    bsp = None # Queued again by the next update() that still wants it
+                with self.cond:
+                    self.loading = None
+                    if bsp is not None and not self.closed:
+                        self._store(key, bsp)
+                    self.cond.notify_all()
+
+        def close(self):
+            """Stop the loader thread (after any chunk it is loading)."""
+            with self.cond:
+                self.closed = True
+                self.queue = []
+                self.cond.notify_all()
+
+        def trees(self, x, z):
+            """BSPTrees of the wanted resident chunks, far to near from (x, z) for painter's order."""
+            size = self.course.size
+            with self.cond:
+                chunks = [(key, bsp) for key, (bsp, _) in self.resident.items() if key in self.wanted]
+            chunks.sort(key=lambda c: -(((c[0][0] + 0.5) * size - x) ** 2 + ((c[0][1] + 0.5) * size - z) ** 2))
+            return [bsp for _, bsp in chunks]
+
+    def draw_world(screen, cam, trees, floor, zbuffer=None, timer=None):
+        """Course geometry for one frame. trees: the BSPTree of a whole course, or of each resident
+        chunk far to near. timer: optional FrameTimer, marked after floor/sort/world.
+        cam.visible_count / culled_count cover all trees."""
+        masks, visible_count, culled_count = [], 0, 0
+        for bsp in trees:
+            visible = cam.cull_spheres(bsp.mesh.centers, bsp.mesh.radii)
+            visible_count += cam.visible_count
+            culled_count += cam.culled_count
+            lod = bsp.mesh.lod_mask(cam) # Only the detail level each object shows at its screen size
+            if lod is not None:
+                visible = visible & lod if np is not None else [v and l for v, l in zip(visible, lod)]
+            masks.append(visible)
+        cam.visible_count, cam.culled_count = visible_count, culled_count
+        if zbuffer is not None:
+            # Depth-tested fill: order-independent, so no BSP walk
+            zbuffer.clear(cam, SKY_BLUE, floor)
+            for bsp, visible in zip(trees, masks):
+                zbuffer.fill_mesh(cam, bsp.mesh, np.flatnonzero(visible))
+            zbuffer.present(screen)
+            if timer is not None: timer.mark("world")
+            return
+        if floor is not None:
+            floor.draw(screen, cam)
+        else:
+            screen.fill(SKY_BLUE)
+        if timer is not None: timer.mark("floor")
+        # Frustum cull, then take painter's order from each BSP (no per-frame sort)
+        orders = [[i for i in bsp.back_to_front(cam.x, cam.y, cam.z) if visible[i]]
+                  for bsp, visible in zip(trees, masks)]
+        if timer is not None: timer.mark("sort")
+        for bsp, visible, order in zip(trees, masks, orders):
+            proj = cam.project_many(bsp.mesh.verts, bsp.mesh.vertex_mask(visible))
+            bsp.mesh.draw(screen, cam, proj, order)
+        if timer is not None: timer.mark("world")
+
+    def draw_hud(level_name, mario):
+        ui_text = render_text(font, f"{level_name}  STAR: 0  x: {int(mario.x)} z: {int(mario.z)}", (255, 255, 255))
+        screen.blit(ui_text, (20, 20))
+        inst_text = render_text(font, "ARROWS: Move | SPACE: Jump | Q/E: Yaw | R/F: Pitch", (255, 255, 0))
+        screen.blit(inst_text, (20, HEIGHT - 40))
+
+    # ---------------- BENCHMARK ----------------
+    FRAME_PHASES = ("input", "update", "floor", "sort", "world", "mario", "hud", "overlay", "flip")
+
+    class FrameTimer:
+        """Splits one frame's wall time into FRAME_PHASES (perf_counter between marks)."""
+        def __init__(self):
+            self.times = dict.fromkeys(FRAME_PHASES, 0.0)
+            self.last = 0.0
+
+        def start(self):
+            for phase in self.times:
+                self.times[phase] = 0.0
+            self.last = time.perf_counter()
+
+        def mark(self, phase):
+            """Charge the time since the previous mark to phase."""
+            now = time.perf_counter()
+            self.times[phase] += now - self.last
+            self.last = now
+
+    def percentile(sorted_values, p):
+        """Nearest-rank percentile of an ascending list."""
+        if not sorted_values: return 0.0
+        return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+    def tile_mesh(mesh, n):
+        """n copies of a course side by side on a grid (copy 0 in place): a synthetic N x polygons level."""
+        polys = list(mesh)
+        if n <= 1 or not polys: return mesh
+        xs = [p[0] for poly in polys for p in poly.points]
+        zs = [p[2] for poly in polys for p in poly.points]
+        step = max(max(xs) - min(xs), max(zs) - min(zs)) + 200
+        side = math.ceil(math.sqrt(n))
+        tiled = LevelMesh()
+        for k in range(n):
+            ox, oz = (k % side) * step, (k // side) * step
+            moved = {} # Each copy of a LOD object gets its own sphere and level
+            for poly in polys:
+                lod = poly.lod
+                if lod is not None:
+                    if id(lod[0]) not in moved:
+                        moved[id(lod[0])] = lod[0].moved(ox, 0, oz)
+                    lod = (moved[id(lod[0])], lod[1])
+                tiled.add([(x + ox, y, z + oz) for x, y, z in poly.points], poly.color, lod)
+        return tiled
+
+    def benchmark(frames=300, poly_scale=1, renderer="painter", mode7=True, levels=None, warmup=10, out=None):
+        """Time every phase of the game frame on each course under the SDL dummy driver.
+
+        Mario runs and jumps while camera events orbit and tilt Lakitu around him.
+        poly_scale tiles each course that many times. The first warmup frames of each course
+        (sprite/text cache fills) are not sampled. Prints per-phase and total
+        p50/p95/p99 in ms and returns {course name: {phase: sorted seconds}}.
+        """
+        global mario, cam
+        out = out or sys.stdout
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        init_display()
+        zbuffer = ZBufferRenderer() if renderer == "zbuffer" and np is not None else None
+        orbit = (0, 0, 2, 0, 0, 3) # Camera event codes: two quarter turns, tilt, two more, tilt back
+        timer = FrameTimer()
+        results = {}
+        print(f"benchmark: {frames} frames/course, {poly_scale}x polygons, {renderer}, mode7={mode7}", file=out)
+        print(f"{'course':22} {'polys':>6} {'phase':>6} {'p50':>7} {'p95':>7} {'p99':>7}  (ms)", file=out)
+        for idx in (range(len(LEVELS)) if levels is None else levels):
+            name = LEVELS[idx][0]
+            floor, bsp, collision = build_course(idx, mode7, lambda mesh: tile_mesh(mesh, poly_scale))
+            mesh = bsp.mesh
+            mario, cam = Mario(), Camera()
+            spawn(mario, cam, idx, collision)
+            samples = {phase: [] for phase in FRAME_PHASES + ("frame",)}
+            for frame in range(-warmup, frames):
+                if frame % 40 == 0:
+                    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=CAMERA_EVENT_KEYS[orbit[frame // 40 % len(orbit)]]))
+                buttons = BUTTON_UP | (BUTTON_LEFT if frame % 120 < 30 else 0) | (BUTTON_JUMP if frame % 50 == 0 else 0)
+                timer.start()
+                for event in pygame.event.get():
+                    if event.type == pygame.KEYDOWN and event.key in CAMERA_EVENT_KEYS:
+                        camera_event(cam, CAMERA_EVENT_KEYS.index(event.key))
+                timer.mark("input")
+                mario.update(buttons_to_keys(buttons))
+                cam.update(mario.x, mario.y, mario.z)
+                timer.mark("update")
+                draw_world(screen, cam, [bsp], floor, zbuffer, timer)
+                mario.draw(screen, cam)
+                timer.mark("mario")
+                draw_hud(name, mario)
+                timer.mark("hud")
+                pygame.display.flip()
+                timer.mark("flip")
+                if frame < 0: continue
+                for phase, t in timer.times.items():
+                    samples[phase].append(t)
+                samples["frame"].append(sum(timer.times.values()))
+            for values in samples.values():
+                values.sort()
+            results[name] = samples
+            for phase, values in samples.items():
+                if not values[-1]: continue # Phase unused by this renderer
+                print(f"{name if phase == 'input' else '':22} {len(mesh) if phase == 'input' else '':>6} {phase:>6} "
+                      + " ".join(f"{percentile(values, p) * 1000:7.2f}" for p in (50, 95, 99)), file=out)
+        pygame.quit()
+        return results
+
+    # ---------------- PROFILER OVERLAY ----------------
+    PROFILE_FRAMES = 240     # Frames kept in the ring buffer (one graph column each)
+    PROFILE_GRAPH_H = 100    # Graph height in pixels ...
+    PROFILE_GRAPH_MS = 50    # ... for this many ms of frame time
+    PROFILE_TEXT_EVERY = 15  # Frames between refreshes of the numbers (keeps the text cache quiet)
+    PHASE_COLORS = {
+        "input": (200, 200, 200), "update": (80, 220, 80), "floor": (60, 120, 255), "sort": (255, 220, 0),
+        "world": (255, 140, 0), "mario": (230, 40, 40), "hud": (200, 80, 255), "overlay": (120, 120, 120),
+        "flip": (0, 220, 220),
+    }
+
+    class FrameProfiler:
+        """Toggleable overlay: per-phase times of the last PROFILE_FRAMES frames as a stacked graph.
+        While disabled run() passes no timer around, so the only cost is one flag check per frame."""
+        def __init__(self, frames=PROFILE_FRAMES):
+            self.enabled = False
+            self.timer = FrameTimer()
+            self.history = [[0.0] * len(FRAME_PHASES) for _ in range(frames)] # Ring buffer, seconds
+            self.head = 0  # Next slot to write
+            self.count = 0
+            self.graph = pygame.Surface((frames, PROFILE_GRAPH_H))
+            self.lines = []
+            self.panel = None
+
+        def toggle(self):
+            self.enabled = not self.enabled
+            if self.enabled:
+                self.count = 0
+                self.graph.fill((0, 0, 0))
+                self.lines = []
+
+        def end_frame(self):
+            """Store the timer's phases as the newest frame and draw its graph column."""
+            row = self.history[self.head]
+            for i, phase in enumerate(FRAME_PHASES):
+                row[i] = self.timer.times[phase]
+            self.head = (self.head + 1) % len(self.history)
+            self.count = min(self.count + 1, len(self.history))
+
+            # Scroll the graph one pixel and stack this frame's phases in the new column
+            x = self.graph.get_width() - 1
+            self.graph.scroll(-1, 0)
+            self.graph.fill((0, 0, 0), (x, 0, 1, PROFILE_GRAPH_H))
+            px_per_s = PROFILE_GRAPH_H * 1000 / PROFILE_GRAPH_MS
+            y = PROFILE_GRAPH_H
+            for phase, t in zip(FRAME_PHASES, row):
+                h = t * px_per_s
+                if h > 0:
+                    self.graph.fill(PHASE_COLORS[phase], (x, int(y - h), 1, max(1, int(y) - int(y - h))))
+                    y -= h
+            budget_y = PROFILE_GRAPH_H - int(px_per_s / FPS)
+            self.graph.set_at((x, budget_y), (255, 255, 255))
+
+        def recent(self):
+            """Rows of the buffered frames, oldest first."""
+            n = len(self.history)
+            return [self.history[(self.head - self.count + i) % n] for i in range(self.count)]
+
+        def draw(self, screen, polys_drawn, polys_total):
+            if self.count % PROFILE_TEXT_EVERY == 1 or not self.lines:
+                rows = self.recent()
+                frames = sorted(sum(r) for r in rows)
+                means = [sum(r[i] for r in rows) / max(1, len(rows)) for i in range(len(FRAME_PHASES))]
+                self.lines = [render_text(font, f"frame p50 {percentile(frames, 50)*1000:.1f}  p99 {percentile(frames, 99)*1000:.1f} ms", (255, 255, 255)),
+                              render_text(font, f"polys {polys_drawn}/{polys_total}", (255, 255, 255))]
+                self.lines += [render_text(font, f"{phase:7} {m * 1000:5.2f} ms", PHASE_COLORS[phase])
+                               for phase, m in zip(FRAME_PHASES, means)]
+            w = max(self.graph.get_width(), *(l.get_width() for l in self.lines)) + 20
+            h = PROFILE_GRAPH_H + 20 + sum(l.get_height() for l in self.lines)
+            x0, y0 = WIDTH - w - 10, 10
+            if self.panel is None or self.panel.get_size() != (w, h):
+                self.panel = pygame.Surface((w, h), pygame.SRCALPHA)
+                self.panel.fill((0, 0, 0, 160))
+            screen.blit(self.panel, (x0, y0))
+            screen.blit(self.graph, (x0 + 10, y0 + 10))
+            y = y0 + PROFILE_GRAPH_H + 15
+            for line in self.lines:
+                screen.blit(line, (x0 + 10, y))
+                y += line.get_height()
+
+    # ---------------- MAIN LOOP (run entry point) ----------------
+    def run(renderer="painter", mode7=True, dirty_rects=True, max_fps=FPS, profile=False, record=None, replay=None,
+            course_dir=None, stream=False):
+        """Run Ultra Mario 3D Bros. No external files; all rendering in-code.
+        renderer: "painter" (BSP order + pygame.draw) or "zbuffer" (NumPy depth buffer).
+        mode7: draw each course's base quad as an infinite textured Mode 7 floor.
+        dirty_rects: in menus, repaint and present only what changed instead of flipping every frame.
+        max_fps: in-game frame cap (0 = uncapped); physics runs at SIM_HZ regardless.
+        profile: start with the profiler overlay shown (F3 toggles it in game).
+        record: path to write each course session's inputs to (InputRecording) when it ends.
+        replay: path of an InputRecording to play back instead of the keyboard, starting in its course.
+        course_dir: directory of exported level files (--export) to load instead of running the builders.
+        stream: split each course into chunks and keep only those near Mario and the camera resident
+            (loaded in the background, evicted under CHUNK_BUDGET_BYTES); chunk directories in
+            course_dir are used when present."""
+        global game_state, mario, cam, world_trees, world_floor
+        init_display()
         game_state = "menu"
         course_sel = 0
         current_level_name = ""
+        # The z-buffer backend needs NumPy; without it we stay on the painter
+        zbuffer = ZBufferRenderer() if renderer == "zbuffer" and np is not None else None
+        use_mode7 = mode7 and np is not None
         mario = Mario()
         cam = Camera()
-        world_polys = build_castle_grounds()
+
+        def build(idx):
+            """Exported level file when course_dir has a matching one, else the builder."""
+            if course_dir is not None and level_file_mode7(course_path(course_dir, idx)) == use_mode7:
+                return load_course(course_path(course_dir, idx))
+            return build_course(idx, use_mode7)
+        courses = CourseCache(build)
+
+        def build_chunked(idx):
+            """Exported chunk directory when course_dir has a matching one (same level format and
+            Mode 7 flag), else split from the builder."""
+            if course_dir is not None:
+                index = chunk_index(chunks_path(course_dir, idx))
+                if index is not None and index.get("format") == LEVEL_MAGIC.decode() and index.get("mode7") == use_mode7:
+                    try:
+                        return ChunkedCourse.load(chunks_path(course_dir, idx))
+                    except ValueError:
+                        pass # Unreadable export: rebuild as if there were none
+            return ChunkedCourse.from_builder(idx, use_mode7)
+
+        world_floor = world_trees = None # Built by load_level() when a course is entered
+        streamer = None # ChunkStreamer of the current course when streaming
 
         def load_level(idx):
-            nonlocal world_polys, current_level_name
-            name, builder, sx, sy, sz, ground_y = LEVELS[idx]
-            world_polys = builder()
-            mario.x, mario.y, mario.z = sx, sy, sz
-            mario.ground_y = ground_y
-            mario.vel_fwd = 0
-            mario.vel_y = 0
-            cam.x, cam.y, cam.z = mario.x, mario.y + 200, mario.z + 300
-            cam.yaw = 0
-            cam.pitch = math.radians(15)
-            cam.target_yaw = 0
-            cam.target_pitch = math.radians(15)
-            current_level_name = name
+            global world_trees, world_floor
+            nonlocal current_level_name, accumulator, prev_mario, prev_cam, recorder, streamer
+            if stream:
+                if streamer is not None:
+                    streamer.close()
+                streamer = ChunkStreamer(build_chunked(idx))
+                current_level_name = spawn(mario, cam, idx, streamer.course.collision)
+                streamer.update([(mario.x, mario.z), (cam.x, cam.z)], wait=True) # No pop-in on the first frame
+                world_floor, world_trees = streamer.course.floor, streamer.trees(cam.x, cam.z)
+            else:
+                world_floor, bsp, collision = courses.get(idx) # Static geometry: draw order comes from the tree
+                world_trees = [bsp]
+                current_level_name = spawn(mario, cam, idx, collision)
+            accumulator = 0.0
+            prev_mario, prev_cam = snapshot(mario), snapshot(cam)
+            if record is not None:
+                recorder = InputRecording(idx)
 
+        def end_session():
+            nonlocal recorder, playback
+            if recorder is not None:
+                recorder.save(record)
+                recorder = None
+            playback = None
+
+        profiler = FrameProfiler()
+        profiler.enabled = profile
+        recorder = None  # InputRecording of the session being played, when recording
+        playback = None  # InputRecording driving the session instead of the keyboard
+        replay_step = 0
+        if replay is not None:
+            playback = InputRecording.load(replay)
+            load_level(playback.level_idx)
+            game_state = "playing"
+        accumulator = 0.0 # Unsimulated ms carried between frames
+        frame_ms = 0      # Length of the last presented frame
+        prev_mario, prev_cam = snapshot(mario), snapshot(cam) # State before the latest physics step
+        shown = None # (game_state, blink/selection) the menu on screen was drawn for; None forces a full repaint
         running = True
         while running:
+            timer = profiler.timer if profiler.enabled and game_state == "playing" else None
+            if timer is not None: timer.start()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
+                    end_session()
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.VIDEORESIZE):
+                    shown = None
                 if event.type == pygame.KEYDOWN:
                     if game_state == "menu":
                         if event.key == pygame.K_SPACE or event.key == pygame.K_RETURN:
@@ -530,14 +2796,14 @@
                     elif game_state == "playing":
                         if event.key == pygame.K_ESCAPE:
                             game_state = "course_select"
-                        if event.key == pygame.K_q:
-                            cam.target_yaw -= math.pi / 2
-                        if event.key == pygame.K_e:
-                            cam.target_yaw += math.pi / 2
-                        if event.key == pygame.K_r:
-                            cam.target_pitch = max(PITCH_MIN, cam.target_pitch + math.radians(12))
-                        if event.key == pygame.K_f:
-                            cam.target_pitch = min(PITCH_MAX, cam.target_pitch - math.radians(12))
+                            end_session()
+                        if event.key == pygame.K_F3:
+                            profiler.toggle()
+                        if event.key in CAMERA_EVENT_KEYS and playback is None:
+                            code = CAMERA_EVENT_KEYS.index(event.key)
+                            camera_event(cam, code)
+                            if recorder is not None:
+                                recorder.camera_event(code)
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and game_state == "course_select":
                     idx = get_course_click(event.pos)
                     if idx is not None:
@@ -545,45 +2811,93 @@
                         load_level(course_sel)
                         game_state = "playing"
 
-            if game_state == "menu":
-                draw_main_menu()
-                pygame.display.flip()
-                clock.tick(FPS)
-                continue
-            if game_state == "course_select":
-                draw_course_select(course_sel)
-                pygame.display.flip()
-                clock.tick(FPS)
+            if game_state in ("menu", "course_select"):
+                prev = shown[1] if dirty_rects and shown is not None and shown[0] == game_state else None
+                if game_state == "menu":
+                    key, dirty = draw_main_menu(prev)
+                else:
+                    key, dirty = course_sel, draw_course_select(course_sel, prev)
+                    if not stream:
+                        courses.prefetch(course_sel) # Build it while the player is still choosing
+                shown = (game_state, key)
+                present(dirty)
+                report_startup()
+                frame_ms = clock.tick(FPS)
                 continue
+            shown = None
 
+            # Fixed timestep: run as many physics steps as the elapsed time covers
             keys = pygame.key.get_pressed()
-            mario.update(keys)
-            cam.update(mario.x, mario.y, mario.z)
-
-            screen.fill(SKY_BLUE)
-
-            def get_poly_dist(poly):
-                ax = sum(p[0] for p in poly.points) / len(poly.points)
-                ay = sum(p[1] for p in poly.points) / len(poly.points)
-                az = sum(p[2] for p in poly.points) / len(poly.points)
-                return (ax - cam.x)**2 + (ay - cam.y)**2 + (az - cam.z)**2
+            if timer is not None: timer.mark("input")
+            accumulator += frame_ms
+            steps = 0
+            while accumulator >= SIM_DT and steps < MAX_SIM_STEPS:
+                if playback is not None:
+                    if replay_step >= len(playback):
+                        break
+                    buttons, events = playback[replay_step]
+                    for code in events:
+                        camera_event(cam, code)
+                    keys = buttons_to_keys(buttons)
+                    replay_step += 1
+                elif recorder is not None:
+                    recorder.step(keys_to_buttons(keys))
+                prev_mario, prev_cam = snapshot(mario), snapshot(cam)
+                mario.update(keys)
+                cam.update(mario.x, mario.y, mario.z)
+                accumulator -= SIM_DT
+                steps += 1
+            if steps == MAX_SIM_STEPS:
+                accumulator = min(accumulator, SIM_DT) # Too far behind: let the game slow down
+            if playback is not None and replay_step >= len(playback):
+                end_session()
+                game_state = "course_select"
+                continue
+            if streamer is not None:
+                streamer.update([(mario.x, mario.z), (cam.x, cam.z)])
+                world_trees = streamer.trees(cam.x, cam.z)
+            if timer is not None: timer.mark("update")
+            # Draw the state the fractional step left over would reach
+            alpha = accumulator / SIM_DT
+            sim_mario = lerp_state(mario, prev_mario, alpha)
+            sim_cam = lerp_state(cam, prev_cam, alpha)
 
-            world_polys.sort(key=get_poly_dist, reverse=True)
-            for poly in world_polys:
-                poly.draw(screen, cam)
+            draw_world(screen, cam, world_trees, world_floor, zbuffer, timer)
             mario.draw(screen, cam)
+            restore_state(mario, sim_mario)
+            restore_state(cam, sim_cam)
+            if timer is not None: timer.mark("mario")
 
-            ui_text = font.render(f"{current_level_name}  STAR: 0  x: {int(mario.x)} z: {int(mario.z)}", True, (255, 255, 255))
-            screen.blit(ui_text, (20, 20))
-            inst_text = font.render("ARROWS: Move | SPACE: Jump | Q/E: Yaw | R/F: Pitch", True, (255, 255, 0))
-            screen.blit(inst_text, (20, HEIGHT - 40))
+            draw_hud(current_level_name, mario)
+            if timer is not None:
+                timer.mark("hud")
+                profiler.draw(screen, cam.visible_count, sum(len(bsp.mesh) for bsp in world_trees))
+                timer.mark("overlay")
 
             pygame.display.flip()
-            clock.tick(FPS)
+            report_startup()
+            if timer is not None:
+                timer.mark("flip")
+                profiler.end_frame()
+            frame_ms = clock.tick(max_fps)
 
         pygame.quit()
 
 
     if __name__ == "__main__":
-        run()
+        if "--export" in sys.argv:
+            # --export DIR : write every course as a memory-mappable level file and a chunk directory
+            out_dir = sys.argv[sys.argv.index("--export") + 1]
+            os.makedirs(out_dir, exist_ok=True)
+            for idx in range(len(LEVELS)):
+                export_course(idx, course_path(out_dir, idx))
+                export_chunks(idx, chunks_path(out_dir, idx))
+        elif "--bench" in sys.argv:
+            # --bench [N] : benchmark every course with N x polygons (default 1)
+            args = sys.argv[sys.argv.index("--bench") + 1:]
+            benchmark(poly_scale=int(args[0]) if args and args[0].isdigit() else 1,
+                      renderer="zbuffer" if "--zbuffer" in sys.argv else "painter")
+        else:
+            run(course_dir=sys.argv[sys.argv.index("--courses") + 1] if "--courses" in sys.argv else None,
+                stream="--stream" in sys.argv)
         sys.exit(0)